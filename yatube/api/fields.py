@@ -0,0 +1,69 @@
+"""Поля ресурсов API и выбор их через ?fields=."""
+from posts.counters import profile_of
+
+FIELDS_SEPARATOR = ','
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: isoformat(post.pub_date),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'comments_count': lambda post: post.comments_count,
+}
+
+GROUP_FIELDS = {
+    'id': lambda group: group.pk,
+    'title': lambda group: group.title,
+    'slug': lambda group: group.slug,
+    'description': lambda group: group.description,
+    'posts_count': lambda group: group.posts_count,
+}
+
+PROFILE_FIELDS = {
+    'id': lambda user: user.pk,
+    'username': lambda user: user.username,
+    'first_name': lambda user: user.first_name,
+    'last_name': lambda user: user.last_name,
+    'posts_count': lambda user: profile_of(user).posts_count,
+    'followers_count': lambda user: profile_of(user).followers_count,
+    'following_count': lambda user: profile_of(user).following_count,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: isoformat(comment.created),
+}
+
+
+class UnknownFields(ValueError):
+    pass
+
+
+def select(request, available):
+    """Поля из ?fields=a,b в порядке запроса; без параметра - все.
+
+    Неизвестное поле - UnknownFields.
+    """
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    names = [name.strip() for name in raw.split(FIELDS_SEPARATOR)]
+    names = [name for name in names if name]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise UnknownFields(', '.join(unknown))
+    return list(dict.fromkeys(names))
+
+
+def serialize(obj, names, available):
+    return {name: available[name](obj) for name in names}
@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        for i in range(5):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый текст {i}',
+                group=cls.group if i % 2 else None,
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_posts_fields_and_pages(self):
+        """Лента постов: выбор полей и страницы по курсору"""
+        url = reverse('api:posts') + '?fields=id,text&limit=2'
+        texts = []
+        while url:
+            data = self.client.get(url).json()
+            for item in data['results']:
+                self.assertEqual(set(item), {'id', 'text'})
+            texts += [item['text'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(
+            texts, [f'Тестовый текст {i}' for i in reversed(range(5))]
+        )
+
+    def test_unknown_field(self):
+        """Неизвестное поле - ошибка 400"""
+        response = self.client.get(reverse('api:posts') + '?fields=secret')
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без чтения ленты"""
+        url = reverse('api:posts')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=ApiTest.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_resources(self):
+        """Группы, профиль, пост и его комментарии"""
+        group = self.client.get(reverse(
+            'api:group_posts', kwargs={'slug': 'testovyij-slag'}
+        )).json()
+        self.assertEqual(len(group['results']), 2)
+        profile = self.client.get(reverse(
+            'api:profile', kwargs={'username': 'author'}
+        )).json()
+        self.assertEqual(profile['posts_count'], 5)
+        self.assertEqual(profile['followers_count'], 1)
+        post = self.client.get(reverse(
+            'api:post', kwargs={'post_id': ApiTest.post.pk}
+        )).json()
+        self.assertEqual(post['comments_count'], 1)
+        comments = self.client.get(reverse(
+            'api:post_comments', kwargs={'post_id': ApiTest.post.pk}
+        )).json()
+        self.assertEqual(comments['results'][0]['author'], 'reader')
+        groups = self.client.get(reverse('api:groups')).json()
+        self.assertEqual(groups['results'][0]['slug'], 'testovyij-slag')
+
+    def test_follow_feed(self):
+        """Лента подписок только для авторизованных"""
+        url = reverse('api:follow')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(ApiTest.reader)
+        data = self.client.get(url).json()
+        self.assertEqual(len(data['results']), 5)
+
+    def test_read_only(self):
+        """API не принимает запись"""
+        response = self.client.post(reverse('api:posts'), {'text': 'Пост'})
+        self.assertEqual(response.status_code, 405)
+
+    def test_bulk_create(self):
+        """Пакетное создание из JSON и NDJSON с результатами по постам"""
+        url = reverse('api:bulk_create')
+        self.assertEqual(self.client.post(url, '[]', 'application/json')
+                         .status_code, 401)
+        self.client.force_login(ApiTest.author)
+        data = self.client.post(
+            url,
+            '[{"text": "Импорт", "group": "testovyij-slag"}, {"text": ""}]',
+            'application/json',
+        ).json()
+        self.assertEqual((data['created'], data['failed']), (1, 1))
+        self.assertEqual(
+            Post.objects.get(pk=data['results'][0]['id']).group, ApiTest.group
+        )
+        data = self.client.post(
+            url, '{"text": "Первый"}\n{"text": "Второй"}\n',
+            'application/x-ndjson',
+        ).json()
+        self.assertEqual(data['created'], 2)
+        response = self.client.post(url, '{не json', 'application/json')
+        self.assertEqual(response.status_code, 400)
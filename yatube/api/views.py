@@ -0,0 +1,258 @@
+"""JSON API: чтение постов, групп, профилей и комментариев и пакетное
+создание постов для импортёров.
+
+Ответы строятся на тех же querysets, что и HTML-страницы. Строгий ETag
+складывается из адреса и версии данных ресурса - дат публикации и
+правки постов, меток удаления и денормализованных счётчиков (те же
+версии, что у HTML-страниц в posts.conditional). Клиент, опрашивающий ленту
+с If-None-Match, получает 304, и сама лента не читается.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Sum
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import (condition, require_POST,
+                                          require_safe)
+
+from posts import bulk, conditional, shards
+from posts.cache import removal
+from posts.models import (ArchivedComment, ArchivedPost, Comment, Group,
+                          Post)
+from posts.paginators import KeysetPaginator, MergedPaginator
+from posts.timeline import follow_posts
+from users.models import Profile
+
+from . import fields
+
+User = get_user_model()
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def make_etag(request, version):
+    """ETag ответа: одинаковый ответ при одинаковых адресе и версии
+    данных."""
+    raw = f'{request.get_full_path()}|{version!r}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def versioned(name, compute):
+    """condition() с ETag по версии ресурса compute(**kwargs).
+
+    Версия кэшируется в поколении кэша лент, как у HTML-страниц.
+    """
+    def etag(request, **kwargs):
+        return make_etag(
+            request, conditional.version(name, compute, *kwargs.values())
+        )
+    return condition(etag_func=etag)
+
+
+def personal(version):
+    """condition() с ETag по версии, зависящей от пользователя."""
+    def etag(request, **kwargs):
+        return make_etag(request, version(request))
+    return condition(etag_func=etag)
+
+
+def find_post(post_id, queryset):
+    """Пост из queryset или архива (id у архивного тот же) и признак
+    архива."""
+    obj = shards.of_post(queryset, post_id).filter(pk=post_id).first()
+    if obj is not None:
+        return obj, False
+    archived = ArchivedPost.objects.for_feed()
+    return get_object_or_404(archived, pk=post_id), True
+
+
+def login_required(view):
+    """Как auth.login_required, но с 401 в JSON вместо редиректа."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Нужна авторизация', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', settings.POSTS_ON_PAGE))
+    except ValueError:
+        size = settings.POSTS_ON_PAGE
+    return min(max(size, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def page_link(request, direction, cursor):
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params[direction] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def resource_response(request, obj, available):
+    try:
+        names = fields.select(request, available)
+    except fields.UnknownFields as unknown:
+        return error(f'Неизвестные поля: {unknown}', 400)
+    return JsonResponse(fields.serialize(obj, names, available))
+
+
+def page_response(request, queryset, available, field='pub_date',
+                  descending=True):
+    """Страница по курсору ?after= / ?before= размером ?limit=."""
+    try:
+        names = fields.select(request, available)
+    except fields.UnknownFields as unknown:
+        return error(f'Неизвестные поля: {unknown}', 400)
+    if shards.needs_scatter(queryset):
+        paginator = MergedPaginator(
+            shards.split(queryset), page_size(request),
+            field=field, descending=descending,
+        )
+    else:
+        paginator = KeysetPaginator(
+            queryset, page_size(request), field=field, descending=descending
+        )
+    page = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return JsonResponse({
+        'results': [
+            fields.serialize(obj, names, available) for obj in page
+        ],
+        'next': (
+            page_link(request, 'after', page.next_cursor)
+            if page.has_next() else None
+        ),
+        'previous': (
+            page_link(request, 'before', page.previous_cursor)
+            if page.has_previous() else None
+        ),
+    })
+
+
+def groups_version():
+    return Group.objects.aggregate(
+        count=Count('pk'), posts=Sum('posts_count')
+    )
+
+
+def follow_version(request):
+    following = (
+        Profile.objects.filter(user=request.user)
+        .values_list('following_count', flat=True)
+        .first()
+    )
+    return (
+        request.user.pk, following,
+        *conditional.feed_version(follow_posts(request.user)), removal(),
+    )
+
+
+@require_safe
+@versioned('index', conditional.index_version)
+def posts(request):
+    return page_response(request, Post.objects.for_feed(), fields.POST_FIELDS)
+
+
+@require_safe
+@versioned('post_detail', conditional.post_version)
+def post(request, post_id):
+    obj, _ = find_post(post_id, Post.objects.for_feed())
+    return resource_response(request, obj, fields.POST_FIELDS)
+
+
+@require_safe
+@versioned('post_detail', conditional.post_version)
+def post_comments(request, post_id):
+    _, archived = find_post(post_id, Post.objects.only('pk'))
+    if archived:
+        comments = ArchivedComment.objects.filter(
+            post_id=post_id
+        ).select_related('author')
+    else:
+        comments = shards.of_post(
+            shards.related(
+                Comment.objects.filter(post_id=post_id), 'author'
+            ),
+            post_id,
+        )
+    return page_response(
+        request, comments, fields.COMMENT_FIELDS,
+        field='created', descending=False,
+    )
+
+
+@require_safe
+@versioned('api:groups', groups_version)
+def groups(request):
+    return page_response(
+        request, Group.objects.all(), fields.GROUP_FIELDS,
+        field='title', descending=False,
+    )
+
+
+@require_safe
+@versioned('group_posts', conditional.group_version)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return page_response(
+        request, group.posts.for_feed(), fields.POST_FIELDS
+    )
+
+
+@require_safe
+@versioned('profile', conditional.profile_version)
+def profile(request, username):
+    user = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    return resource_response(request, user, fields.PROFILE_FIELDS)
+
+
+@require_safe
+@versioned('profile', conditional.profile_version)
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return page_response(
+        request, author.posts.for_feed(), fields.POST_FIELDS
+    )
+
+
+@require_safe
+@login_required
+@personal(follow_version)
+def follow(request):
+    return page_response(
+        request, follow_posts(request.user).for_feed(), fields.POST_FIELDS
+    )
+
+
+@require_POST
+@login_required
+def bulk_create(request):
+    """Создаёт посты из массива JSON или NDJSON (по Content-Type)."""
+    try:
+        text = request.body.decode()
+        if request.content_type in bulk.NDJSON_TYPES:
+            items = bulk.read_ndjson(text.splitlines())
+        else:
+            items = bulk.read_json(text)
+    except (UnicodeDecodeError, bulk.ParseError) as problem:
+        return error(str(problem), 400)
+    results = list(bulk.create(request.user, items))
+    created = sum('id' in result for result in results)
+    return JsonResponse({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results,
+    })
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import seed, workload
+
+from .seed_yatube import add_seed_arguments, seed_options
+
+COLUMNS = ('requests', 'errors', 'rps', 'p50', 'p95', 'p99', 'queries')
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными, прогоняет смесь запросов '
+        'к публичным страницам и сравнивает результат с базовым'
+    )
+
+    def add_arguments(self, parser):
+        add_seed_arguments(parser)
+        parser.add_argument(
+            '--skip-seed', action='store_true',
+            help='Не создавать данные, гонять нагрузку на имеющихся',
+        )
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--transport', choices=('client', 'http'), default='client',
+            help='Тестовый клиент Django или WSGI-сервер в этом процессе',
+        )
+        parser.add_argument(
+            '--output', help='Куда сохранить сводку в JSON',
+        )
+        parser.add_argument(
+            '--baseline', help='Базовая сводка в JSON для сравнения',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=20.0,
+            help='Допустимое ухудшение rps и p95, в процентах',
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            created = seed.populate(**seed_options(options))
+            self.stdout.write(', '.join(
+                f'{name}: {count}' for name, count in created.items()
+            ))
+        plan = workload.build_plan(options['requests'], seed=options['seed'])
+        results, elapsed = workload.replay(
+            plan, options['workers'], options['transport']
+        )
+        summary = workload.report(results, elapsed)
+        self.write_table(summary)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(summary, output, indent=2, ensure_ascii=False)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                lines, regressions = workload.compare(
+                    summary, json.load(baseline), options['tolerance']
+                )
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError(
+                    'Регрессия относительно базовой сводки: '
+                    + '; '.join(regressions)
+                )
+
+    def write_table(self, summary):
+        self.stdout.write(
+            f'{"endpoint":<14}' + ''.join(f'{name:>10}' for name in COLUMNS)
+        )
+        for name, entry in summary.items():
+            self.stdout.write(f'{name:<14}' + ''.join(
+                f'{"-" if entry[column] is None else entry[column]:>10}'
+                for column in COLUMNS
+            ))
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import seed
+
+
+def add_seed_arguments(parser):
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=4000)
+    parser.add_argument(
+        '--follows', type=int, default=20,
+        help='Среднее число подписок пользователя',
+    )
+    parser.add_argument(
+        '--images', type=float, default=0.0,
+        help='Доля постов с картинкой',
+    )
+    parser.add_argument(
+        '--exponent', type=float, default=1.2,
+        help='Показатель степенного распределения популярности',
+    )
+    parser.add_argument(
+        '--days', type=int, default=365,
+        help='За сколько дней разнести даты постов',
+    )
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument(
+        '--chunk-size', type=int, default=seed.CHUNK_SIZE,
+        help='Сколько записей вставлять в одной транзакции',
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=None,
+        help='Записей в одном INSERT (по умолчанию - максимум для БД)',
+    )
+
+
+def seed_options(options):
+    return {
+        name: options[name]
+        for name in (
+            'users', 'groups', 'posts', 'comments', 'follows', 'images',
+            'exponent', 'days', 'seed', 'chunk_size', 'batch_size',
+        )
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстро заполняет базу синтетическими пользователями, группами, '
+        'постами, комментариями и подписками'
+    )
+
+    def add_arguments(self, parser):
+        add_seed_arguments(parser)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(model, done):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{model._meta.label}: {done} '
+                    f'({time.monotonic() - started:.1f} с)'
+                )
+
+        created = seed.populate(progress=progress, **seed_options(options))
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{name}: {count}' for name, count in created.items())
+            + f' за {time.monotonic() - started:.1f} с'
+        ))
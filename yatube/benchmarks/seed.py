@@ -0,0 +1,327 @@
+"""Синтетический набор данных для нагрузочных прогонов.
+
+Данные зависят только от параметров и seed: авторы, подписки и
+комментарии распределены по степенному закону, как в живой соцсети -
+немногие авторы собирают большую часть подписчиков и комментариев.
+
+Набор рассчитан на миллионы записей, поэтому ничего не держится
+в памяти целиком: записи генерируются порциями по chunk_size, каждая
+порция вставляется через bulk_create в своей транзакции. Ключи
+назначаются заранее, а даты постов растут вместе с id и вычисляются по
+нему, так что комментарии и подписки ссылаются на записи без запросов
+к базе. Сигналы при bulk_create не срабатывают, поэтому счётчики,
+поисковый индекс и ленты пересчитываются в конце.
+"""
+import io
+import math
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from posts import counters, search, timeline
+from posts.cache import bump_generation
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Записей в одной транзакции; размер пачки INSERT выбирает бэкенд БД
+CHUNK_SIZE = 20000
+PASSWORD = 'benchmark'
+# Картинок немного, посты ссылаются на них повторно
+IMAGE_COUNT = 8
+IMAGE_SIZE = (1200, 800)
+WORDS = (
+    'город', 'река', 'утро', 'дорога', 'книга', 'музыка', 'кофе', 'поезд',
+    'море', 'лес', 'работа', 'друзья', 'вечер', 'фото', 'кино', 'снег',
+    'лето', 'проект', 'код', 'горы', 'кошка', 'собака', 'дом', 'небо',
+)
+
+
+def power_law_rank(rng, count, exponent):
+    """Случайный ранг от 0 до count - 1; ранг r выпадает примерно
+    с вероятностью 1 / (r + 1) ** exponent.
+
+    Обратное преобразование непрерывного распределения Парето
+    на [1, count + 1): не требует таблицы весов размером count.
+    """
+    u = rng.random()
+    if exponent == 1:
+        rank = (count + 1) ** u
+    else:
+        power = 1 - exponent
+        rank = (1 + u * ((count + 1) ** power - 1)) ** (1 / power)
+    return min(int(rank) - 1, count - 1)
+
+
+class Scatter:
+    """Биекция ранга популярности в id: популярные записи разбросаны
+    по таблице, а не идут подряд с первого id."""
+
+    def __init__(self, rng, first, count):
+        self.first, self.count = first, max(count, 1)
+        self.step = rng.randrange(1, self.count + 1)
+        while math.gcd(self.step, self.count) != 1:
+            self.step += 1
+        self.shift = rng.randrange(self.count)
+
+    def __call__(self, rank):
+        return self.first + (rank * self.step + self.shift) % self.count
+
+
+class Timeline:
+    """Даты постов: растут вместе с id, с шагом span / count."""
+
+    def __init__(self, now, days, count):
+        self.now, self.count = now, max(count, 1)
+        self.start = now - timedelta(days=days)
+        self.step = timedelta(days=days) / self.count
+
+    def lower(self, index):
+        return self.start + self.step * index
+
+    def post_date(self, rng, index):
+        return self.lower(index) + self.step * rng.random()
+
+    def comment_date(self, rng, index):
+        # Комментарий не может быть раньше поста
+        after = self.lower(index + 1)
+        return after + (self.now - after) * rng.random()
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize()
+
+
+def make_images(rng, count):
+    """Сохраняет count картинок-градиентов и возвращает их имена."""
+    names = []
+    for _ in range(count):
+        start = tuple(rng.randrange(256) for _ in range(3))
+        end = tuple(rng.randrange(256) for _ in range(3))
+        image = Image.linear_gradient('L').resize(IMAGE_SIZE)
+        image = Image.merge('RGB', [
+            image.point(lambda x, a=a, b=b: a + (b - a) * x // 255)
+            for a, b in zip(start, end)
+        ])
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        names.append(default_storage.save(
+            'posts/benchmark.jpg', ContentFile(buffer.getvalue())
+        ))
+    return names
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now_add у полей, чтобы bulk_create сохранил
+    сгенерированные даты."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+@contextmanager
+def deferred_indexes(*models):
+    """Снимает индексы из Meta.indexes на время загрузки и строит их
+    заново в конце: один проход по таблице быстрее, чем поддержка
+    индексов на каждой вставке.
+
+    Внутри внешней транзакции схему не трогает: SQLite не даёт менять
+    её посреди транзакции.
+    """
+    if connection.in_atomic_block:
+        yield
+        return
+    with connection.schema_editor() as editor:
+        for model in models:
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model in models:
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+
+
+def insert(model, objects, chunk_size, batch_size, progress):
+    """Вставляет записи порциями по chunk_size, каждую в своей
+    транзакции; возвращает число вставленных записей."""
+    done = 0
+    chunk = []
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            done += flush(model, chunk, batch_size)
+            progress(model, done)
+            chunk = []
+    if chunk:
+        done += flush(model, chunk, batch_size)
+        progress(model, done)
+    return done
+
+
+def flush(model, chunk, batch_size):
+    with transaction.atomic():
+        model.objects.bulk_create(chunk, batch_size=batch_size)
+    return len(chunk)
+
+
+class Dataset:
+    """Генераторы строк каждой таблицы набора."""
+
+    def __init__(self, users, groups, posts, comments, follows, images,
+                 exponent, days, seed):
+        self.users, self.groups, self.posts = users, groups, posts
+        self.comments, self.follows = comments, follows
+        self.images, self.exponent = images, exponent
+        self.rng = rng = random.Random(seed)
+        self.first_user = next_pk(User)
+        self.first_group = next_pk(Group)
+        self.first_post = next_pk(Post)
+        self.first_comment = next_pk(Comment)
+        self.authors = Scatter(rng, self.first_user, users)
+        self.hot_posts = Scatter(rng, self.first_post, posts)
+        self.dates = Timeline(timezone.now(), days, posts)
+        self.image_names = make_images(rng, IMAGE_COUNT) if images else []
+
+    def author(self):
+        return self.authors(
+            power_law_rank(self.rng, self.users, self.exponent)
+        )
+
+    def user_rows(self):
+        password = make_password(PASSWORD)
+        for pk in range(self.first_user, self.first_user + self.users):
+            yield User(
+                pk=pk,
+                username=f'bench{pk}',
+                first_name=self.rng.choice(WORDS).capitalize(),
+                last_name=f'Тестов {pk}',
+                password=password,
+                date_joined=self.dates.start,
+            )
+
+    def group_rows(self):
+        for pk in range(self.first_group, self.first_group + self.groups):
+            yield Group(
+                pk=pk,
+                title=f'Группа {pk}',
+                slug=f'bench-{pk}',
+                description=sentence(self.rng, 12),
+            )
+
+    def group_id(self):
+        if self.groups and self.rng.random() < 0.7:
+            return self.first_group + self.rng.randrange(self.groups)
+        return None
+
+    def post_rows(self):
+        rng = self.rng
+        for index in range(self.posts if self.users else 0):
+            post = Post(
+                pk=self.first_post + index,
+                author_id=self.author(),
+                group_id=self.group_id(),
+                text=sentence(rng, rng.randint(5, 60)),
+                pub_date=self.dates.post_date(rng, index),
+            )
+            if self.image_names and rng.random() < self.images:
+                post.image = rng.choice(self.image_names)
+            yield post
+
+    def comment_rows(self):
+        if not (self.users and self.posts):
+            return
+        rng = self.rng
+        first = self.first_comment
+        for pk in range(first, first + self.comments):
+            post_id = self.hot_posts(
+                power_law_rank(rng, self.posts, self.exponent)
+            )
+            yield Comment(
+                pk=pk,
+                post_id=post_id,
+                author_id=self.first_user + rng.randrange(self.users),
+                text=sentence(rng, rng.randint(3, 25)),
+                created=self.dates.comment_date(
+                    rng, post_id - self.first_post
+                ),
+            )
+
+    def follow_rows(self):
+        for user_id in range(self.first_user, self.first_user + self.users):
+            count = min(self.users - 1, self.rng.randint(0, self.follows * 2))
+            chosen = set()
+            for _ in range(count * 3):
+                author_id = self.author()
+                if author_id != user_id:
+                    chosen.add(author_id)
+                if len(chosen) == count:
+                    break
+            for author_id in sorted(chosen):
+                yield Follow(user_id=user_id, author_id=author_id)
+
+
+def populate(users=200, groups=10, posts=2000, comments=4000, follows=20,
+             images=0.0, exponent=1.2, days=365, seed=42,
+             chunk_size=CHUNK_SIZE, batch_size=None, progress=None):
+    """Создаёт набор данных и возвращает число созданных записей.
+
+    follows - среднее число подписок пользователя, images - доля постов
+    с картинкой, progress(model, done) вызывается после каждой порции.
+    """
+    dataset = Dataset(
+        users, groups, posts, comments, follows, images, exponent, days, seed
+    )
+    progress = progress or (lambda model, done: None)
+    tables = (
+        ('users', User, dataset.user_rows()),
+        ('groups', Group, dataset.group_rows()),
+        ('posts', Post, dataset.post_rows()),
+        ('comments', Comment, dataset.comment_rows()),
+        ('follows', Follow, dataset.follow_rows()),
+    )
+    with deferred_indexes(Post, Comment), explicit_dates(
+        Post._meta.get_field('pub_date'), Comment._meta.get_field('created')
+    ):
+        created = {
+            name: insert(model, rows, chunk_size, batch_size, progress)
+            for name, model, rows in tables
+        }
+    finish(dataset.first_user)
+    return created
+
+
+def finish(first_user):
+    """Приводит денормализованные данные в соответствие с таблицами."""
+    counters.repair()
+    if search.available():
+        search.rebuild()
+    if settings.TIMELINE_ENABLED:
+        follows = Follow.objects.filter(user_id__gte=first_user).values_list(
+            'user_id', 'author_id'
+        )
+        for user_id, author_id in follows.iterator():
+            timeline.backfill(user_id, author_id)
+    bump_generation()
@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post
+from users.models import Profile
+
+from . import seed, workload
+
+User = get_user_model()
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.created = seed.populate(
+            users=20, groups=3, posts=60, comments=80, follows=4, seed=7
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_populate(self):
+        """Данные созданы, счётчики пересчитаны, даты разнесены"""
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(Follow.objects.count(), self.created['follows'])
+        self.assertEqual(
+            sum(Profile.objects.values_list('posts_count', flat=True)), 60
+        )
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 50
+        )
+        for comment in Comment.objects.select_related('post'):
+            self.assertGreaterEqual(comment.created, comment.post.pub_date)
+
+    def test_seed_command_is_deterministic(self):
+        """seed_yatube с тем же seed создаёт те же данные и индексы"""
+        def snapshot():
+            return (
+                list(Post.objects.values_list(
+                    'pk', 'author', 'group', 'text'
+                )),
+                list(Comment.objects.values_list('pk', 'post', 'author')),
+                list(Follow.objects.values_list('user', 'author')),
+            )
+
+        first = snapshot()
+        for model in (Follow, Comment, Post):
+            model.objects.all().delete()
+        Profile.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command(
+            'seed_yatube', users=20, groups=3, posts=60, comments=80,
+            follows=4, seed=7, chunk_size=25, stdout=StringIO(),
+        )
+        self.assertEqual(snapshot(), first)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table
+            )
+        self.assertIn('post_pub_date_idx', constraints)
+
+    def test_plan_is_reproducible(self):
+        """Один seed - один и тот же план запросов"""
+        self.assertEqual(
+            workload.build_plan(50, seed=3), workload.build_plan(50, seed=3)
+        )
+        self.assertNotEqual(
+            workload.build_plan(50, seed=3), workload.build_plan(50, seed=4)
+        )
+
+    def test_command_report_and_baseline(self):
+        """Команда пишет сводку и падает при регрессии"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'summary.json')
+            call_command(
+                'benchmark', skip_seed=True, requests=40, workers=1,
+                output=output, stdout=StringIO(),
+            )
+            with open(output) as summary_file:
+                summary = json.load(summary_file)
+            self.assertEqual(summary['total']['requests'], 40)
+            self.assertEqual(summary['total']['errors'], 0)
+            self.assertIsNotNone(summary['index']['queries'])
+            for entry in summary.values():
+                entry['rps'] *= 100
+            with open(output, 'w') as baseline_file:
+                json.dump(summary, baseline_file)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmark', skip_seed=True, requests=40, workers=1,
+                    baseline=output, stdout=StringIO(),
+                )
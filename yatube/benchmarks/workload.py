@@ -0,0 +1,315 @@
+"""Воспроизводимая нагрузка на публичные страницы.
+
+План запросов строится заранее по seed, поэтому два прогона на одних
+данных отправляют одни и те же запросы. Запросы выполняет тестовый
+клиент Django или настоящий WSGI-сервер в отдельном потоке; число
+SQL-запросов берётся из заголовка Server-Timing (core.middleware).
+"""
+import random
+import re
+import string
+import threading
+import time
+from collections import defaultdict, namedtuple
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from urllib.request import HTTPErrorProcessor, Request, build_opener
+from wsgiref.simple_server import (WSGIRequestHandler, WSGIServer,
+                                   make_server)
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.timing import PERCENTILES, percentile
+from posts.models import Group, Post
+
+from .seed import power_law_rank
+
+User = get_user_model()
+
+# Доли страниц в смеси запросов; True - нужен вход на сайт
+ENDPOINTS = {
+    'index': (30, False),
+    'group_posts': (15, False),
+    'profile': (15, False),
+    'post_detail': (25, False),
+    'follow_index': (10, True),
+    'add_comment': (5, True),
+}
+SAMPLE_SIZE = 200
+QUERIES = re.compile(r'(\d+) queries')
+
+Call = namedtuple('Call', 'endpoint method path data user_id')
+Result = namedtuple('Result', 'endpoint seconds status queries')
+
+
+def build_plan(count, seed=42, exponent=1.2):
+    """count запросов в случайном, но воспроизводимом порядке.
+
+    Популярные посты, группы и авторы запрашиваются чаще остальных.
+    """
+    rng = random.Random(seed)
+    posts = list(
+        Post.objects.order_by('-comments_count', '-pk')
+        .values_list('pk', flat=True)[:SAMPLE_SIZE]
+    )
+    groups = list(
+        Group.objects.order_by('-posts_count', 'pk')
+        .values_list('slug', flat=True)[:SAMPLE_SIZE]
+    )
+    authors = list(
+        User.objects.order_by('-profile__followers_count', 'pk')
+        .values_list('username', flat=True)[:SAMPLE_SIZE]
+    )
+    readers = list(
+        User.objects.filter(is_active=True).order_by('pk')
+        .values_list('pk', flat=True)[:SAMPLE_SIZE]
+    )
+    targets = {
+        'group_posts': groups,
+        'profile': authors,
+        'post_detail': posts,
+        'add_comment': posts,
+    }
+    names = [
+        name for name in ENDPOINTS
+        if name not in targets or targets[name]
+    ]
+    if not readers:
+        names = [name for name in names if not ENDPOINTS[name][1]]
+    weights = [ENDPOINTS[name][0] for name in names]
+    plan = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        user_id = rng.choice(readers) if ENDPOINTS[name][1] else None
+        values = targets.get(name)
+        target = (
+            values[power_law_rank(rng, len(values), exponent)]
+            if values else None
+        )
+        plan.append(make_call(name, target, user_id, rng))
+    return plan
+
+
+def make_call(name, target, user_id, rng):
+    if name in ('index', 'follow_index'):
+        return Call(name, 'GET', reverse(f'posts:{name}'), None, user_id)
+    if name == 'group_posts':
+        path = reverse('posts:group_posts', kwargs={'slug': target})
+    elif name == 'profile':
+        path = reverse('posts:profile', kwargs={'username': target})
+    elif name == 'post_detail':
+        path = reverse('posts:post_detail', kwargs={'post_id': target})
+    else:
+        path = reverse('posts:add_comment', kwargs={'post_id': target})
+        data = {'text': f'Комментарий под нагрузкой {rng.randrange(10**6)}'}
+        return Call(name, 'POST', path, data, user_id)
+    return Call(name, 'GET', path, None, user_id)
+
+
+def queries_from(header):
+    found = QUERIES.search(header or '')
+    return int(found.group(1)) if found else None
+
+
+class ClientTransport:
+    """Запросы через тестовый клиент Django, без сети."""
+
+    def __init__(self):
+        self.clients = {}
+
+    def client(self, user_id):
+        if user_id not in self.clients:
+            client = Client(HTTP_HOST='localhost')
+            if user_id is not None:
+                client.force_login(User.objects.get(pk=user_id))
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    def __call__(self, call):
+        client = self.client(call.user_id)
+        if call.method == 'POST':
+            response = client.post(call.path, call.data)
+        else:
+            response = client.get(call.path)
+        return response.status_code, response.get('Server-Timing')
+
+
+class RawResponses(HTTPErrorProcessor):
+    """Отдаёт ответы как есть: без исключений и переходов по
+    редиректам, как тестовый клиент."""
+
+    def http_response(self, request, response):
+        return response
+
+    https_response = http_response
+
+
+class HttpTransport:
+    """Запросы по HTTP к WSGI-серверу, запущенному в этом процессе."""
+
+    def __init__(self, server_url):
+        self.server_url = server_url
+        self.openers = {}
+
+    def opener(self, user_id):
+        if user_id not in self.openers:
+            opener = build_opener(RawResponses())
+            # Сессию и CSRF-токен выдаём напрямую, минуя форму входа
+            token = ''.join(random.choices(
+                string.ascii_letters + string.digits, k=32
+            ))
+            cookies = [f'{settings.CSRF_COOKIE_NAME}={token}']
+            if user_id is not None:
+                client = Client()
+                client.force_login(User.objects.get(pk=user_id))
+                session = client.cookies[settings.SESSION_COOKIE_NAME].value
+                cookies.append(f'{settings.SESSION_COOKIE_NAME}={session}')
+            opener.addheaders = [
+                ('Cookie', '; '.join(cookies)),
+                ('X-CSRFToken', token),
+            ]
+            self.openers[user_id] = opener
+        return self.openers[user_id]
+
+    def __call__(self, call):
+        data = urlencode(call.data).encode() if call.data else None
+        request = Request(
+            self.server_url + call.path, data=data, method=call.method
+        )
+        with self.opener(call.user_id).open(request) as response:
+            response.read()
+            return response.status, response.headers['Server-Timing']
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    """Запускает WSGI-сервер на свободном порту; возвращает сервер и URL."""
+    server = make_server(
+        '127.0.0.1', 0, get_wsgi_application(),
+        server_class=ThreadingWSGIServer, handler_class=QuietHandler,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def run_calls(calls, transport, results):
+    for call in calls:
+        started = time.monotonic()
+        status, timing = transport(call)
+        results.append(Result(
+            call.endpoint, time.monotonic() - started, status,
+            queries_from(timing),
+        ))
+
+
+# Число запросов берётся из заголовка, который иначе видит только персонал
+@override_settings(TIMING_HEADER=True)
+def replay(plan, workers=4, transport='client'):
+    """Выполняет план в workers потоков.
+
+    Возвращает список Result и общее время прогона в секундах.
+    """
+    server = None
+    if transport == 'http':
+        server, server_url = start_server()
+
+    def make_transport():
+        if server is None:
+            return ClientTransport()
+        return HttpTransport(server_url)
+
+    results = []
+    started = time.monotonic()
+    try:
+        if workers <= 1:
+            run_calls(plan, make_transport(), results)
+        else:
+            threads = [
+                threading.Thread(
+                    target=worker,
+                    args=(plan[number::workers], make_transport, results),
+                )
+                for number in range(workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        elapsed = time.monotonic() - started
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return results, elapsed
+
+
+def worker(calls, make_transport, results):
+    try:
+        run_calls(calls, make_transport(), results)
+    finally:
+        connections.close_all()
+
+
+def report(results, elapsed):
+    """Сводка по страницам: запросы в секунду, перцентили времени (мс),
+    среднее число SQL-запросов."""
+    grouped = defaultdict(list)
+    for result in results:
+        grouped[result.endpoint].append(result)
+    grouped['total'] = results
+    summary = {}
+    for name in [*ENDPOINTS, 'total']:
+        items = grouped.get(name)
+        if not items:
+            continue
+        latencies = sorted(item.seconds * 1000 for item in items)
+        queries = [item.queries for item in items if item.queries is not None]
+        entry = {
+            'requests': len(items),
+            'errors': sum(item.status >= 400 for item in items),
+            'rps': round(len(items) / elapsed, 2) if elapsed else 0,
+        }
+        for percent in PERCENTILES:
+            entry[f'p{percent}'] = round(percentile(latencies, percent), 2)
+        entry['queries'] = (
+            round(sum(queries) / len(queries), 2) if queries else None
+        )
+        summary[name] = entry
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """Сравнивает сводку с базовой; возвращает строки с изменениями
+    и список регрессий больше tolerance процентов."""
+    lines, regressions = [], []
+    for name, entry in summary.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        changes = []
+        for metric, worse_if_higher in (('rps', False), ('p95', True)):
+            if not base.get(metric):
+                continue
+            change = (entry[metric] - base[metric]) / base[metric] * 100
+            changes.append(f'{metric} {change:+.1f}%')
+            if (change if worse_if_higher else -change) > tolerance:
+                regressions.append(f'{name} {metric} {change:+.1f}%')
+        if entry['queries'] is not None and base.get('queries') is not None:
+            changes.append(
+                f'queries {entry["queries"] - base["queries"]:+.2f}'
+            )
+        lines.append(f'{name}: {", ".join(changes)}')
+    return lines, regressions
@@ -0,0 +1,64 @@
+"""Пользователь запроса без лишних запросов к базе.
+
+Без cookie сессии запрос анонимный сразу: сессия не читается вовсе.
+С cookie пользователь берётся из кэша по id из сессии, а в базу
+AuthenticationMiddleware идёт только при промахе. Сохранение или
+удаление пользователя сбрасывает его запись в кэше (см. core.signals),
+поэтому смена пароля, как и без кэша, завершает чужие сессии.
+
+Сброс виден всем процессам только в общем кэше: с кэшем в памяти
+процесса AUTH_USER_CACHE_TIMEOUT = 0 и пользователь не кэшируется
+(см. core.checks).
+"""
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY, get_user_model, load_backend)
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget(user_id):
+    cache.delete(user_key(user_id))
+
+
+def load_user(backend_path, user_id):
+    """Пользователь из кэша или через бэкенд аутентификации."""
+    key = user_key(user_id)
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    user = cache.get(key) if timeout else None
+    if user is None:
+        user = load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return None
+        if timeout:
+            cache.set(key, user, timeout)
+    user.backend = backend_path
+    return user
+
+
+def get_user(request):
+    """Замена django.contrib.auth.get_user с кэшем пользователя."""
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return AnonymousUser()
+    session = request.session
+    try:
+        user_id = get_user_model()._meta.pk.to_python(session[SESSION_KEY])
+        backend_path = session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    user = load_user(backend_path, user_id)
+    if user is None:
+        return AnonymousUser()
+    session_hash = session.get(HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(
+            session_hash, user.get_session_auth_hash())):
+        session.flush()
+        return AnonymousUser()
+    return user
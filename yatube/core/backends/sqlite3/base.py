@@ -0,0 +1,87 @@
+"""SQLite с настройками для работы под нагрузкой.
+
+* WAL: читатели не ждут писателя, а писатель - читателей;
+* synchronous=NORMAL, кэш страниц, mmap и временные таблицы в памяти;
+* транзакции начинаются с BEGIN IMMEDIATE: блокировка на запись берётся
+  сразу и ждёт busy timeout, а не падает посреди транзакции при попытке
+  перейти от чтения к записи;
+* запрос вне транзакции при «database is locked» повторяется с растущей
+  случайной паузой - он атомарен сам по себе, и повтор безопасен.
+
+В OPTIONS базы, кроме параметров sqlite3.connect (timeout - это busy
+timeout в секундах), понимаются pragmas - словарь, дополняющий PRAGMAS,
+retries - число повторов и retry_delay - первая пауза в секундах.
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+Database = base.Database
+
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    # Отрицательный cache_size - размер в килобайтах: 64 МБ
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+RETRIES = 5
+RETRY_DELAY = 0.05
+LOCKED = ('database is locked', 'database table is locked')
+
+
+def is_locked(error):
+    return any(message in str(error) for message in LOCKED)
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    """Курсор, повторяющий запрос вне транзакции, если база занята."""
+    retries = RETRIES
+    retry_delay = RETRY_DELAY
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args)
+            except Database.OperationalError as error:
+                if (attempt >= self.retries or not is_locked(error)
+                        or self.connection.in_transaction):
+                    raise
+            # Случайная пауза разводит одновременно повторяющих писателей
+            time.sleep(self.retry_delay * 2 ** attempt * random.uniform(1, 2))
+            attempt += 1
+
+    def execute(self, query, params=None):
+        return self._retry(base.SQLiteCursorWrapper.execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(
+            base.SQLiteCursorWrapper.executemany, query, param_list
+        )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.retries = params.pop('retries', RETRIES)
+        self.retry_delay = params.pop('retry_delay', RETRY_DELAY)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.retries = self.retries
+        cursor.retry_delay = self.retry_delay
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
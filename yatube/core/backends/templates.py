@@ -0,0 +1,21 @@
+from django.template.backends.django import DjangoTemplates, Template
+
+from .. import timing
+
+
+class TimedTemplate(Template):
+    """Шаблон, время отрисовки которого попадает в замеры запроса."""
+
+    def render(self, context=None, request=None):
+        with timing.measure('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,90 @@
+"""Кэш с защитой от «лавины» запросов при истечении ключа.
+
+Вместе со значением хранится момент его логического истечения и время,
+которое заняло вычисление. Это позволяет:
+
+* пересчитывать значение заранее с вероятностью, растущей к моменту
+  истечения (XFetch);
+* пускать на пересчёт только один процесс (блокировка в самом кэше);
+* остальным до конца пересчёта отдавать устаревшее значение.
+
+Значения, посчитанные по чтениям с реплики, хранятся отдельно и не
+дольше её допустимого отставания (core.routers.replica_key).
+"""
+import math
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+from .routers import replica_key
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def stats():
+    """Счётчики попаданий, промахов и выдачи устаревших значений."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _store(key, compute, timeout, stale_timeout):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    entry = (value, time.time() + timeout, delta)
+    cache.set(key, entry, timeout + stale_timeout)
+    return value
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, beta=1.0,
+                   lock_timeout=10, wait_timeout=2.0, poll_interval=0.05):
+    """Значение по ключу key; при необходимости вычисляет его compute().
+
+    timeout - сколько значение считается свежим, stale_timeout - сколько
+    ещё его можно отдавать, пока другой процесс считает новое.
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+    stale_timeout = replica_key(key, stale_timeout)[1]
+    key, timeout = replica_key(key, timeout)
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        # XFetch: -log(u) для u из (0, 1] - экспоненциальный сдвиг вперёд
+        gap = -delta * beta * math.log(1.0 - random.random())
+        if time.time() + gap < expires:
+            _count('hit')
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            _count('stale')
+            return value
+        _count('early' if time.time() < expires else 'refresh')
+        try:
+            return _store(key, compute, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+    _count('miss')
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            return _store(key, compute, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        entry = cache.get(key)
+        if entry is not None:
+            _count('wait')
+            return entry[0]
+    _count('wait_timeout')
+    return _store(key, compute, timeout, stale_timeout)
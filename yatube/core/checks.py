@@ -0,0 +1,54 @@
+"""Проверки настроек, которым нужен общий для процессов кэш.
+
+Сигналы сбрасывают кэш (поколение лент) только в том кэше, который
+видит записавший процесс. С LocMemCache у каждого процесса свой кэш,
+поэтому долго хранить в нём то, что сбрасывается сигналами, нельзя,
+а сессии и пользователей сессий - вовсе.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+CACHED_SESSIONS = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+# Сколько процесс может отдавать ленты, устаревшие из-за чужой записи
+LOCAL_CACHE_TIMEOUT = 20
+
+
+def local_cache():
+    """Кэш по умолчанию свой у каждого процесса."""
+    return settings.CACHES['default']['BACKEND'] in LOCAL_CACHES
+
+
+@register()
+def shared_cache(app_configs, **kwargs):
+    if not local_cache():
+        return []
+    errors = []
+    if settings.FEED_CACHE_TIMEOUT > LOCAL_CACHE_TIMEOUT:
+        errors.append(Error(
+            'FEED_CACHE_TIMEOUT больше '
+            f'{LOCAL_CACHE_TIMEOUT} с при кэше в памяти процесса',
+            hint='Настройте общий кэш (MEMCACHED_LOCATION) или сократите '
+                 'FEED_CACHE_TIMEOUT',
+            id='core.E001',
+        ))
+    if settings.SESSION_ENGINE in CACHED_SESSIONS:
+        errors.append(Error(
+            'Сессии в кэше памяти процесса: выход из аккаунта не виден '
+            'другим процессам',
+            hint='Настройте общий кэш (MEMCACHED_LOCATION) или храните '
+                 'сессии в базе',
+            id='core.E002',
+        ))
+    if settings.AUTH_USER_CACHE_TIMEOUT:
+        errors.append(Error(
+            'Пользователи сессий в кэше памяти процесса: смена пароля '
+            'не завершает сессии в других процессах',
+            hint='Настройте общий кэш (MEMCACHED_LOCATION) или задайте '
+                 'AUTH_USER_CACHE_TIMEOUT = 0',
+            id='core.E003',
+        ))
+    return errors
@@ -0,0 +1,128 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from . import auth, timing
+from .routers import reading_replica
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class TimingMiddleware:
+    """Замеряет SQL, шаблоны и миниатюры запроса.
+
+    Итог попадает в статистику представления (см. core.timing.stats),
+    а заголовок Server-Timing с ним видят персонал и, при
+    settings.TIMING_HEADER, все клиенты: число запросов к базе - не для
+    посторонних.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.TIMING_ENABLED:
+            return self.get_response(request)
+        with timing.recording() as recorder, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        summary = recorder.summary()
+        match = getattr(request, 'resolver_match', None)
+        timing.record(match.view_name if match else '<unresolved>', summary)
+        if settings.TIMING_HEADER or is_staff(request):
+            response['Server-Timing'] = server_timing(recorder, summary)
+        return response
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+def server_timing(recorder, summary):
+    def metric(name, seconds, description):
+        return f'{name};dur={seconds * 1000:.1f};desc="{description}"'
+
+    return ', '.join((
+        metric(
+            'db', summary['db'],
+            f'{recorder.query_count} queries, '
+            f'{recorder.duplicates} duplicates',
+        ),
+        metric('tpl', summary['template'], 'templates'),
+        metric('thumb', summary['thumbnail'], 'thumbnails'),
+        metric('total', summary['total'], 'total'),
+    ))
+
+
+class WriteDetector:
+    """Обёртка запросов, замечающая записи в базу."""
+
+    def __init__(self):
+        self.written = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:7].upper().startswith(WRITES):
+            self.written = True
+        return execute(sql, params, many, context)
+
+
+class ReplicaMiddleware:
+    """Отправляет чтения страниц из settings.REPLICA_VIEWS на реплики.
+
+    После запроса, записавшего в любую базу, ставит cookie
+    settings.REPLICA_PIN_COOKIE: пока она жива, страницы этого клиента
+    читаются из основной базы (read-your-writes).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        detector = WriteDetector()
+        with ExitStack() as stack:
+            # Записи идут и в шарды, не только в основную базу
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(detector))
+            request._replica_stack = stack
+            response = self.get_response(request)
+        if detector.written:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(int(time.time()) + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stack = getattr(request, '_replica_stack', None)
+        if (stack is not None and request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name
+                in settings.REPLICA_VIEWS
+                and not pinned(request)):
+            stack.enter_context(reading_replica())
+
+
+def pinned(request):
+    """Закреплён ли клиент за основной базой после своей записи."""
+    try:
+        until = int(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """request.user без чтения сессии для запросов без её cookie и
+    с пользователем из кэша, если он включён (см. core.auth)."""
+
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: auth.get_user(request))
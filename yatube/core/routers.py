@@ -0,0 +1,65 @@
+"""Чтение с реплик для страниц, которые только читают.
+
+ReplicaMiddleware включает реплику на время представлений из
+settings.REPLICA_VIEWS; остальные запросы, все записи и чтения вне
+запроса (команды, фоновые потоки) идут в основную базу. Сессия, которая
+что-то записала, на settings.REPLICA_PIN_SECONDS закрепляется за основной
+базой, чтобы автор сразу видел свой пост, комментарий или подписку,
+даже если реплика отстаёт.
+
+Прочитанное с реплики кэшируется под своими ключами (replica_key) и не
+дольше settings.REPLICA_MAX_LAG: реплика могла ещё не получить запись,
+которая начала поколение кэша (posts.cache). Так устаревшее значение
+не достаётся читающим основную базу и живёт не дольше, чем отставала
+бы сама реплика.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_replica = ContextVar('replica', default=False)
+
+# Сессии читаются из основной базы: вход и выход действуют сразу
+PRIMARY_APPS = {'sessions'}
+
+
+@contextmanager
+def reading_replica():
+    """Чтения внутри блока идут на реплику, если она настроена."""
+    token = _replica.set(True)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def replica_active():
+    """Идут ли сейчас чтения на реплику."""
+    return bool(settings.DATABASE_REPLICAS) and _replica.get()
+
+
+def replica_key(key, timeout):
+    """Ключ и срок кэша для значения, посчитанного по текущим чтениям."""
+    if not replica_active():
+        return key, timeout
+    return f'{key}:replica', min(timeout, settings.REPLICA_MAX_LAG)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (replicas and _replica.get()
+                and model._meta.app_label not in PRIMARY_APPS):
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Явно: иначе объект, прочитанный с реплики, сохранялся бы в неё
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы, связи между ними допустимы
+        return True
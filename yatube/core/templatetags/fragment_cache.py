@@ -0,0 +1,45 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from core.cache import get_or_compute
+
+register = template.Library()
+
+
+class FragmentCacheNode(CacheNode):
+    def render(self, context):
+        try:
+            expire_time = int(self.expire_time_var.resolve(context))
+        except (template.VariableDoesNotExist, TypeError, ValueError):
+            raise template.TemplateSyntaxError(
+                '"fragment_cache" tag needs an integer timeout'
+            )
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time,
+        )
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """Как {% cache %}, но с защитой от одновременного пересчёта.
+
+    {% fragment_cache timeout fragment_name [var1] [var2] ... %}
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(t) for t in tokens[3:]],
+        None,
+    )
@@ -0,0 +1,457 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from posts.models import Comment, Post
+
+from . import auth, checks, timing
+from .backends.sqlite3.base import DatabaseWrapper
+from .cache import get_or_compute, stats
+from .middleware import ReplicaMiddleware
+from .routers import reading_replica
+
+User = get_user_model()
+
+
+class GetOrComputeTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def delta(self, before, event):
+        return stats().get(event, 0) - before.get(event, 0)
+
+    def test_miss_then_hit(self):
+        """Первое обращение считает значение, второе берёт из кэша"""
+        before = stats()
+        self.assertEqual(get_or_compute('k', self.compute, 60), 'значение 1')
+        self.assertEqual(get_or_compute('k', self.compute, 60), 'значение 1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.delta(before, 'miss'), 1)
+        self.assertEqual(self.delta(before, 'hit'), 1)
+
+    @override_settings(DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=5)
+    def test_replica_values_kept_apart(self):
+        """Посчитанное с реплики кэшируется отдельно и ненадолго"""
+        with reading_replica():
+            get_or_compute('k', self.compute, 60)
+            self.assertEqual(get_or_compute('k', self.compute, 60),
+                             'значение 1')
+        self.assertLessEqual(cache.get('k:replica')[1], time.time() + 5)
+        self.assertEqual(get_or_compute('k', self.compute, 60), 'значение 2')
+
+    def test_stale_while_locked(self):
+        """Пока другой процесс пересчитывает, отдаётся старое значение"""
+        cache.set('k', ('старое', time.time() - 1, 0.0), 60)
+        cache.add('k:lock', 1, 60)
+        before = stats()
+        self.assertEqual(get_or_compute('k', self.compute, 60), 'старое')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.delta(before, 'stale'), 1)
+
+    def test_expired_is_recomputed_once(self):
+        """Истёкшее значение пересчитывает тот, кто взял блокировку"""
+        cache.set('k', ('старое', time.time() - 1, 0.0), 60)
+        self.assertEqual(get_or_compute('k', self.compute, 60), 'значение 1')
+        self.assertIsNone(cache.get('k:lock'))
+        self.assertEqual(get_or_compute('k', self.compute, 60), 'значение 1')
+
+    def test_probabilistic_early_refresh(self):
+        """Долгое вычисление обновляется до истечения срока"""
+        cache.set('k', ('старое', time.time() + 1, 1000.0), 60)
+        before = stats()
+        self.assertEqual(get_or_compute('k', self.compute, 60), 'значение 1')
+        self.assertEqual(self.delta(before, 'early'), 1)
+
+    def test_waits_for_lock_owner(self):
+        """Без значения и без блокировки ждём, затем считаем сами"""
+        cache.add('k:lock', 1, 60)
+        value = get_or_compute(
+            'k', self.compute, 60, wait_timeout=0.1, poll_interval=0.01
+        )
+        self.assertEqual(value, 'значение 1')
+
+
+MEMCACHED = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+    }
+}
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    def ids(self):
+        return [error.id for error in checks.shared_cache(None)]
+
+    def test_settings_pass(self):
+        """Настройки проекта проходят проверку"""
+        self.assertEqual(self.ids(), [])
+
+    @override_settings(FEED_CACHE_TIMEOUT=60 * 60)
+    def test_long_feed_ttl_needs_shared_cache(self):
+        """Долгий TTL лент допустим только с общим кэшем"""
+        self.assertEqual(self.ids(), ['core.E001'])
+        with override_settings(CACHES=MEMCACHED):
+            self.assertEqual(self.ids(), [])
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+        AUTH_USER_CACHE_TIMEOUT=60,
+    )
+    def test_cached_sessions_need_shared_cache(self):
+        """Сессии и пользователи в кэше - только с общим кэшем"""
+        self.assertEqual(self.ids(), ['core.E002', 'core.E003'])
+        with override_settings(CACHES=MEMCACHED):
+            self.assertEqual(self.ids(), [])
+
+
+class TimingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        timing.reset()
+
+    @override_settings(TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        """Ответ содержит замеры SQL, шаблонов и общего времени"""
+        response = Client().get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for name in ('db;dur=', 'tpl;dur=', 'thumb;dur=', 'total;dur='):
+            self.assertIn(name, header)
+        self.assertRegex(header, r'desc="[1-9]\d* queries, 0 duplicates"')
+
+    @override_settings(TIMING_HEADER=False)
+    def test_header_for_staff_only(self):
+        """Без TIMING_HEADER заголовок видит только персонал"""
+        client = Client()
+        self.assertNotIn(
+            'Server-Timing', client.get(reverse('posts:index'))
+        )
+        client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        self.assertIn('Server-Timing', client.get(reverse('posts:index')))
+
+    def test_duplicate_queries(self):
+        """Повтор запроса с теми же параметрами считается дублем"""
+        with timing.recording() as recorder:
+            for params in ((1,), (1,), (2,)):
+                recorder(
+                    lambda *args: None, 'SELECT %s', params, False, {}
+                )
+        self.assertEqual(recorder.query_count, 3)
+        self.assertEqual(recorder.duplicates, 1)
+
+    def test_nested_measures_counted_once(self):
+        """Вложенные замеры одного вида не складываются"""
+        with timing.recording() as recorder:
+            with timing.measure('template'):
+                with timing.measure('template'):
+                    time.sleep(0.01)
+        self.assertLess(recorder.durations['template'], 0.02)
+
+    def test_percentile(self):
+        """Перцентиль считается по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(timing.percentile(values, 50), 50)
+        self.assertEqual(timing.percentile(values, 99), 99)
+        self.assertEqual(timing.percentile([7], 95), 7)
+
+    def test_stats_view(self):
+        """Статистика по представлениям доступна только персоналу"""
+        client = Client()
+        for _ in range(3):
+            client.get(reverse('posts:index'))
+        response = client.get(reverse('stats'))
+        self.assertEqual(response.status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client.force_login(staff)
+        view = client.get(reverse('stats')).json()['views']['posts:index']
+        self.assertEqual(view['requests'], 3)
+        self.assertEqual(set(view['total']), {'p50', 'p95', 'p99'})
+        self.assertGreater(view['queries']['p50'], 0)
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        folder = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        self.path = os.path.join(folder, 'db.sqlite3')
+        with self.connect() as cursor:
+            cursor.execute('CREATE TABLE item (value INTEGER)')
+            cursor.execute('INSERT INTO item VALUES (1)')
+
+    def connect(self, **options):
+        """Курсор нового соединения с файлом базы теста."""
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': self.path,
+            'OPTIONS': {'timeout': 0.01, **options},
+        }, alias='sqlite_test')
+        # Соединения потоков теста закрываются в основном потоке
+        wrapper.inc_thread_sharing()
+        self.addCleanup(wrapper.close)
+        return wrapper.cursor()
+
+    def count(self, cursor):
+        cursor.execute('SELECT COUNT(*) FROM item')
+        return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Соединение открывается в режиме WAL с synchronous=NORMAL"""
+        cursor = self.connect()
+        cursor.execute('PRAGMA journal_mode')
+        self.assertEqual(cursor.fetchone()[0], 'wal')
+        cursor.execute('PRAGMA synchronous')
+        self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_reader_not_blocked_by_writer(self):
+        """Пока писатель держит транзакцию, читатель видит прошлые данные"""
+        writer = self.connect()
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute('INSERT INTO item VALUES (2)')
+        reader = self.connect(retries=0)
+        self.assertEqual(self.count(reader), 1)
+        writer.execute('COMMIT')
+        self.assertEqual(self.count(reader), 2)
+
+    def test_concurrent_readers_and_writers(self):
+        """Читатели не ждут писателей: с busy timeout 10 мс и без
+        повторов любая блокировка дала бы ошибку"""
+        errors = []
+        stop = threading.Event()
+
+        def write():
+            cursor = self.connect(timeout=1)
+            while not stop.is_set():
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('INSERT INTO item VALUES (3)')
+                time.sleep(0.005)
+                cursor.execute('COMMIT')
+
+        def read():
+            try:
+                cursor = self.connect(retries=0)
+                for _ in range(50):
+                    self.count(cursor)
+            except Exception as error:
+                errors.append(error)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        stop.set()
+        writer.join()
+        self.assertEqual(errors, [])
+
+    def test_locked_write_retried(self):
+        """Запись вне транзакции повторяется, пока база занята"""
+        holder = self.connect()
+        holder.execute('BEGIN IMMEDIATE')
+        errors = []
+
+        def write(**options):
+            try:
+                self.connect(**options).execute(
+                    'INSERT INTO item VALUES (4)'
+                )
+            except Exception as error:
+                errors.append(error)
+
+        impatient = threading.Thread(target=write, kwargs={'retries': 0})
+        impatient.start()
+        impatient.join()
+        self.assertEqual(len(errors), 1)
+        patient = threading.Thread(
+            target=write, kwargs={'retries': 5, 'retry_delay': 0.05}
+        )
+        patient.start()
+        time.sleep(0.1)
+        holder.execute('COMMIT')
+        patient.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(self.count(holder), 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TransactionTestCase):
+    """Основная база и реплика - две разные базы; реплика догоняет
+    основную только в sync_replica."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(author=self.user, text='Старый пост')
+        self.sync_replica()
+
+    def tearDown(self):
+        # Таблица поиска не модель, flush её не очищает
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+
+    def sync_replica(self):
+        """Копирует основную базу в реплику целиком."""
+        for alias in ('default', 'replica'):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(
+            connections['replica'].connection
+        )
+
+    @override_settings(REPLICA_MAX_LAG=1)
+    def test_reads_from_replica(self):
+        """Страницы ленты читают реплику, пока она не догонит основную"""
+        Post.objects.create(author=self.user, text='Свежий пост')
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Свежий пост')
+        # Версия страницы с реплики кэшируется
+        with CaptureQueriesContext(connections['replica']) as queries:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        # но не дольше допустимого отставания реплики
+        self.sync_replica()
+        time.sleep(1.1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, 'Свежий пост')
+
+    def test_replica_cache_not_shared(self):
+        """Закреплённый за основной базой не получает кэш с реплики"""
+        Post.objects.create(author=self.user, text='Свежий пост')
+        url = reverse('posts:index')
+        self.assertNotContains(self.client.get(url), 'Свежий пост')
+        author = Client()
+        author.cookies[settings.REPLICA_PIN_COOKIE] = int(time.time()) + 60
+        self.assertContains(author.get(url), 'Свежий пост')
+
+    def test_pinned_after_write(self):
+        """Кто записал, читает основную базу; остальные - реплику"""
+        author = Client()
+        author.force_login(self.user)
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = author.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Мой комментарий'},
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertTrue(Comment.objects.filter(post=self.post).exists())
+        self.assertContains(author.get(url), 'Мой комментарий')
+        self.assertNotContains(Client().get(url), 'Мой комментарий')
+        self.assertNotIn(
+            settings.REPLICA_PIN_COOKIE, Client().get(url).cookies
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class WriteDetectorTest(TestCase):
+    databases = {'default', 'shard_0'}
+
+    def test_shard_write_pins(self):
+        """Запись только в шард тоже закрепляет клиента за основной базой"""
+        def get_response(request):
+            with connections['shard_0'].cursor() as cursor:
+                cursor.execute('UPDATE posts_group SET title = title')
+            return HttpResponse()
+
+        response = ReplicaMiddleware(get_response)(
+            RequestFactory().post('/')
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+
+# Кэш тестов общий: они идут в одном процессе
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTH_USER_CACHE_TIMEOUT=60,
+)
+class CachedAuthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth', password='pass')
+        self.url = reverse('about:author')
+
+    def tables(self, client):
+        """Таблицы сессий и пользователей, прочитанные за запрос."""
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        return response, {
+            table for table in ('django_session', 'auth_user') if table in sql
+        }
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.db',
+        AUTH_USER_CACHE_TIMEOUT=0,
+    )
+    def test_local_cache_settings(self):
+        """Без общего кэша сессия и пользователь читаются из базы"""
+        client = Client()
+        client.force_login(self.user)
+        for _ in range(2):
+            response, tables = self.tables(client)
+            self.assertEqual(response.wsgi_request.user, self.user)
+            self.assertEqual(tables, {'django_session', 'auth_user'})
+        self.assertIsNone(cache.get(auth.user_key(self.user.pk)))
+
+    def test_logout_ends_cached_user(self):
+        """После выхода cookie сессии не даёт пользователя из кэша"""
+        client = Client()
+        client.force_login(self.user)
+        self.tables(client)
+        self.assertIsNotNone(cache.get(auth.user_key(self.user.pk)))
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        client.logout()
+        stale = Client()
+        stale.cookies[settings.SESSION_COOKIE_NAME] = cookie
+        response, _ = self.tables(stale)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_user_from_cache(self):
+        """Пользователь сессии читается из базы один раз до своего
+        изменения"""
+        client = Client()
+        client.force_login(self.user)
+        response, tables = self.tables(client)
+        self.assertEqual(response.wsgi_request.user, self.user)
+        self.assertEqual(tables, {'auth_user'})
+        response, tables = self.tables(client)
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+        self.assertEqual(tables, set())
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        response, tables = self.tables(client)
+        self.assertEqual(tables, {'auth_user'})
+        self.assertEqual(response.wsgi_request.user.first_name, 'Новое имя')
+
+    def test_password_change_ends_sessions(self):
+        """Смена пароля завершает сессию, даже когда пользователь
+        в кэше"""
+        client = Client()
+        client.force_login(self.user)
+        self.tables(client)
+        self.user.set_password('new-pass')
+        self.user.save()
+        response, _ = self.tables(client)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
@@ -0,0 +1,137 @@
+"""Замеры времени запроса: SQL, шаблоны, миниатюры.
+
+Текущий запрос хранит свои замеры в локальной для потока переменной,
+так что код шаблонов и бэкендов может дописывать в них время через
+measure(), не зная ничего о middleware. Итоги запросов складываются
+в кольцевые буферы по именам представлений.
+"""
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+METRICS = ('total', 'db', 'template', 'thumbnail', 'queries')
+PERCENTILES = (50, 95, 99)
+
+_local = threading.local()
+_buffers = defaultdict(deque)
+_buffers_lock = threading.Lock()
+
+
+class Recorder:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.durations = Counter()
+        self.queries = Counter()
+        self._depth = Counter()
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный с теми же
+        параметрами."""
+        return sum(count - 1 for count in self.queries.values())
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обёртка для connection.execute_wrapper
+        self.queries[(sql, repr(params))] += 1
+        with self.measure('db'):
+            return execute(sql, params, many, context)
+
+    @contextmanager
+    def measure(self, name):
+        # Вложенные замеры одного вида (include внутри шаблона)
+        # не должны считать одно и то же время дважды
+        self._depth[name] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._depth[name] -= 1
+            if not self._depth[name]:
+                self.durations[name] += time.monotonic() - started
+
+    def summary(self):
+        return {
+            'total': time.monotonic() - self.started,
+            'db': self.durations['db'],
+            'template': self.durations['template'],
+            'thumbnail': self.durations['thumbnail'],
+            'queries': self.query_count,
+        }
+
+
+def current():
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def recording():
+    """Включает замеры для кода внутри блока."""
+    recorder = Recorder()
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = None
+
+
+@contextmanager
+def measure(name):
+    """Добавляет время блока к замеру name текущего запроса, если он
+    записывается."""
+    recorder = current()
+    if recorder is None:
+        yield
+        return
+    with recorder.measure(name):
+        yield
+
+
+def record(view_name, summary):
+    with _buffers_lock:
+        buffer = _buffers[view_name]
+        if buffer.maxlen != settings.TIMING_BUFFER_SIZE:
+            buffer = _buffers[view_name] = deque(
+                buffer, maxlen=settings.TIMING_BUFFER_SIZE
+            )
+        buffer.append(summary)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу; values отсортированы."""
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[rank - 1]
+
+
+def stats():
+    """Перцентили замеров по представлениям (время - в миллисекундах)."""
+    with _buffers_lock:
+        snapshot = {name: list(buffer) for name, buffer in _buffers.items()}
+    result = {}
+    for name, summaries in snapshot.items():
+        if not summaries:
+            continue
+        view = {'requests': len(summaries)}
+        for metric in METRICS:
+            values = sorted(summary[metric] for summary in summaries)
+            if metric != 'queries':
+                values = [round(value * 1000, 2) for value in values]
+            view[metric] = {
+                f'p{percent}': percentile(values, percent)
+                for percent in PERCENTILES
+            }
+        result[name] = view
+    return result
+
+
+def reset():
+    with _buffers_lock:
+        _buffers.clear()
@@ -0,0 +1,89 @@
+"""Архив старых постов и их комментариев.
+
+Посты старше settings.ARCHIVE_AFTER_DAYS переезжают из Post и Comment
+в ArchivedPost и ArchivedComment с теми же id, поэтому адреса постов не
+меняются. Переносятся сначала самые старые посты, пакетами по
+ARCHIVE_BATCH_SIZE в отдельных транзакциях: горячие таблицы и индексы
+лент остаются маленькими, а каждый архивный пост старше любого
+горячего - профиль просто дочитывает архив после горячих постов.
+
+Счётчики постов в профилях и группах учитывают и архив, поэтому перенос
+их не трогает; записи из поиска и материализованных лент удаляются.
+Архив только для чтения: редактировать и комментировать такие посты
+нельзя. Страница поста, профиль, выгрузка, карта сайта и API читают
+архив вместе с горячими таблицами; поиск и ленты групп и главной -
+только горячие посты.
+"""
+import datetime as dt
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .cache import bump_generation, mark_removal
+from .models import (ArchivedComment, ArchivedPost, Comment, Post,
+                     TimelineEntry)
+
+
+def cutoff(days=None):
+    """Граница архива: посты до этого момента переносятся."""
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    return timezone.now() - dt.timedelta(days=days)
+
+
+def copy(instance, model):
+    """Несохранённая копия instance в model с теми же значениями полей."""
+    return model(**{
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields
+    })
+
+
+def archive_batch(before, batch_size=None):
+    """Переносит в архив до batch_size самых старых постов, опубликованных
+    раньше before, с их комментариями. Возвращает число постов."""
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    with transaction.atomic():
+        posts = list(
+            Post.objects.filter(pub_date__lt=before)
+            .order_by('pub_date', 'pk')[:batch_size]
+        )
+        if not posts:
+            return 0
+        post_ids = [post.pk for post in posts]
+        comments = list(Comment.objects.filter(post_id__in=post_ids))
+        ArchivedPost.objects.bulk_create(
+            copy(post, ArchivedPost) for post in posts
+        )
+        ArchivedComment.objects.bulk_create(
+            copy(comment, ArchivedComment) for comment in comments
+        )
+        # Без сигналов: счётчики уже учитывают архив
+        for model, lookup in (
+            (TimelineEntry, 'post_id__in'),
+            (Comment, 'post_id__in'),
+            (Post, 'pk__in'),
+        ):
+            queryset = model.objects.filter(**{lookup: post_ids})
+            queryset._raw_delete(queryset.db)
+        if search.available():
+            search.remove_many(
+                post_ids, [comment.pk for comment in comments]
+            )
+    mark_removal()
+    bump_generation()
+    return len(posts)
+
+
+def archive(before, batch_size=None, max_batches=None):
+    """Переносит пакеты, пока есть старые посты или не пройдено
+    max_batches пакетов; отдаёт размер каждого пакета."""
+    done = 0
+    while max_batches is None or done < max_batches:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            return
+        done += 1
+        yield moved
@@ -0,0 +1,201 @@
+"""Пакетное создание постов для импорта с других платформ.
+
+Посты приходят массивом JSON или потоком NDJSON (объект на строку)
+с полями text, group (slug) и image (имя уже загруженного файла).
+Каждый проверяется формой с правилами PostForm, корректные вставляются
+через bulk_create порциями по BULK_BATCH_SIZE, каждая в своей
+транзакции. bulk_create не шлёт сигналов, поэтому счётчики, поисковый
+индекс и ленты подписчиков обновляются здесь же, по разу на порцию.
+
+Результат - по записи на пост в порядке входа: {'index', 'id'} для
+созданного и {'index', 'errors'} для отклонённого.
+"""
+import json
+import posixpath
+from collections import Counter
+from itertools import islice
+
+from django import forms
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from PIL import Image
+
+from users.models import Profile
+
+from . import search, shards, thumbnails, timeline
+from .cache import bump_generation, touch_sitemap
+from .counters import change
+from .forms import PostForm
+from .models import ArchivedPost, Group, Post
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/jsonl')
+NOT_OBJECT = 'Ожидался объект с полями поста'
+
+
+class ParseError(ValueError):
+    """Вход или его строку не удалось разобрать как JSON."""
+
+
+class BulkPostForm(PostForm):
+    """PostForm, где группа задана slug, а картинка - именем файла
+    в хранилище."""
+    group = forms.CharField(required=False)
+    image = forms.CharField(required=False)
+
+    def __init__(self, *args, groups, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.groups = groups
+
+    def clean_group(self):
+        slug = self.cleaned_data['group']
+        if not slug:
+            return None
+        if slug not in self.groups:
+            raise forms.ValidationError(f'Группы «{slug}» нет')
+        return self.groups[slug]
+
+    def clean_image(self):
+        name = self.cleaned_data['image']
+        if not name:
+            return ''
+        upload_to = Post._meta.get_field('image').upload_to
+        if posixpath.normpath(name) != name or not name.startswith(upload_to):
+            raise forms.ValidationError(f'Картинка «{name}» не найдена')
+        try:
+            # Та же проверка, что у forms.ImageField для загрузки
+            with default_storage.open(name) as image:
+                Image.open(image).verify()
+        except FileNotFoundError:
+            raise forms.ValidationError(f'Картинка «{name}» не найдена')
+        except Exception:
+            raise forms.ValidationError(f'«{name}» - не картинка')
+        return name
+
+
+def read_json(text):
+    """Посты из массива JSON."""
+    try:
+        items = json.loads(text)
+    except ValueError as error:
+        raise ParseError(f'Неверный JSON: {error}')
+    if not isinstance(items, list):
+        raise ParseError('Ожидался массив постов')
+    return items
+
+
+def read_ndjson(lines):
+    """Посты из строк NDJSON; пустые строки пропускаются, битая строка
+    становится ParseError на месте поста."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            yield ParseError(f'Строка {number}: неверный JSON: {error}')
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def create(author, items, batch_size=None):
+    """Создаёт посты author; отдаёт результаты по мере вставки порций."""
+    numbered = enumerate(items)
+    for batch in batches(numbered, batch_size or settings.BULK_BATCH_SIZE):
+        yield from create_batch(author, batch)
+
+
+def failure(index, errors):
+    return {'index': index, 'errors': errors}
+
+
+def create_batch(author, batch):
+    slugs = {
+        item.get('group') for _, item in batch
+        if isinstance(item, dict) and isinstance(item.get('group'), str)
+    }
+    groups = Group.objects.in_bulk(slugs, field_name='slug')
+    results, posts = {}, {}
+    for index, item in batch:
+        if isinstance(item, ParseError):
+            results[index] = failure(index, {'__all__': [str(item)]})
+        elif not isinstance(item, dict):
+            results[index] = failure(index, {'__all__': [NOT_OBJECT]})
+        else:
+            form = BulkPostForm(item, groups=groups)
+            if form.is_valid():
+                form.instance.author = author
+                posts[index] = form.instance
+            else:
+                results[index] = failure(index, {
+                    field: list(messages)
+                    for field, messages in form.errors.items()
+                })
+    if posts:
+        insert(author, list(posts.values()))
+    for index, post in posts.items():
+        results[index] = {'index': index, 'id': post.pk}
+    return [results[index] for index, _ in batch]
+
+
+def last_id():
+    """Наибольший id, который уже получал какой-нибудь пост.
+
+    Max(pk) опускается после удаления последних постов и переноса их
+    в архив, а их id должны остаться за ними: на них ведут ссылки,
+    sitemap и RSS.
+    """
+    if connection.vendor == 'sqlite':
+        # Счётчик AUTOINCREMENT помнит все выданные ключи, в том числе
+        # заданные явно
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT seq FROM sqlite_sequence WHERE name = %s',
+                [Post._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else 0
+    return max(
+        Post.objects.aggregate(last=Max('pk'))['last'] or 0,
+        ArchivedPost.objects.aggregate(last=Max('pk'))['last'] or 0,
+    )
+
+
+def insert(author, posts):
+    """Вставляет посты одной транзакцией вместе с тем, что обычно
+    делают сигналы post_save."""
+    with transaction.atomic():
+        change(Profile.objects.filter(user=author), 'posts_count', len(posts))
+        groups = Counter(post.group_id for post in posts if post.group_id)
+        for group_id, count in groups.items():
+            change(Group.objects.filter(pk=group_id), 'posts_count', count)
+        using = None
+        if shards.enabled():
+            # bulk_create не шлёт pre_save, где посту выдаётся id шарда
+            using = shards.prepare_posts(author.pk, posts)
+        elif not connection.features.can_return_ids_from_bulk_insert:
+            # Ключи нужны для индекса и лент; запись выше уже заняла
+            # базу на запись, и параллельный импорт их не перехватит
+            first = last_id() + 1
+            for offset, post in enumerate(posts):
+                post.pk = first + offset
+        Post.objects.db_manager(using).bulk_create(posts)
+        if search.available():
+            search.index_posts(posts)
+        if settings.TIMELINE_ENABLED:
+            timeline.fan_out_posts(author.pk, posts)
+    bump_generation()
+    touch_sitemap('posts', *(post.pk for post in posts))
+    touch_sitemap('groups', *groups)
+    touch_sitemap('profiles', author.pk)
+    for post in posts:
+        if post.image:
+            thumbnails.process_upload(post)
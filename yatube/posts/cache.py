@@ -0,0 +1,66 @@
+"""Поколение кэша лент: любое изменение постов сбрасывает фрагменты.
+
+Номер поколения входит в ключи кэшируемых фрагментов, поэтому после
+записи старые фрагменты просто перестают читаться и доживают свой TTL.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'posts:generation'
+REMOVAL_KEY = 'posts:removal'
+SITEMAP_CHUNK_KEY = 'posts:sitemap-chunk:{}:{}'
+
+
+def _fresh_generation():
+    # Поколение от времени не повторяет номера, даже если ключ вытеснили
+    return time.time_ns() // 1000
+
+
+def _stamp(key):
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _fresh_generation(), None)
+        value = cache.get(key)
+    return value
+
+
+def generation():
+    """Текущее поколение кэша лент."""
+    return _stamp(GENERATION_KEY)
+
+
+def bump_generation():
+    """Переходит к новому поколению, делая устаревшими все фрагменты."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, _fresh_generation(), None)
+
+
+def removal():
+    """Метка последнего ухода постов из общей ленты: удаления или
+    переноса в архив. Вытесненная метка заводится заново и тоже
+    считается новой."""
+    return _stamp(REMOVAL_KEY)
+
+
+def mark_removal():
+    cache.set(REMOVAL_KEY, _fresh_generation(), None)
+
+
+def sitemap_chunk(section, number):
+    """Метка страницы number раздела section карты сайта."""
+    return _stamp(SITEMAP_CHUNK_KEY.format(section, number))
+
+
+def touch_sitemap(section, *pks):
+    """Новые метки у страниц раздела section с записями pks."""
+    size = settings.SITEMAP_CHUNK_SIZE
+    for number in {(pk - 1) // size + 1 for pk in pks if pk is not None}:
+        cache.set(
+            SITEMAP_CHUNK_KEY.format(section, number),
+            _fresh_generation(),
+            None,
+        )
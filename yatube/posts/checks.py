@@ -0,0 +1,15 @@
+"""Проверки настроек, несовместимых с шардами постов."""
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def sharded_features(app_configs, **kwargs):
+    if not settings.POST_SHARDS or not settings.TIMELINE_ENABLED:
+        return []
+    # Записи лент в основной базе ссылаются на посты из шардов
+    return [Error(
+        'Материализованные ленты не работают с шардами постов',
+        hint='Выключите TIMELINE_ENABLED или очистите POST_SHARDS',
+        id='posts.E001',
+    )]
@@ -0,0 +1,158 @@
+"""Условные GET для HTML-страниц лент и постов.
+
+Версия страницы собирается из её собственных данных: дат последней
+публикации и последней правки постов ленты, последнего комментария,
+полей группы и счётчиков профиля; удаления из общей ленты отмечает
+posts.cache.removal(). ETag и Last-Modified строятся только из этой
+версии, поэтому запись в одну ленту не сбрасывает валидаторы остальных
+страниц.
+
+Сама версия кэшируется в текущем поколении кэша лент (posts.cache):
+повторный запрос без изменений получает 304, не выполнив ни одного
+запроса к базе, а после любой записи версия пересчитывается.
+"""
+import datetime as dt
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from core.routers import replica_key
+from users.models import Profile
+
+from . import shards
+from .cache import generation, removal
+from .models import Comment, Group, Post
+
+
+def first_row(queryset):
+    """Первая строка без сортировки: фильтр и так выбирает одну запись."""
+    return next(iter(queryset.order_by()[:1]), None)
+
+
+def latest(queryset, field):
+    """Подзапрос с самой поздней датой field; идёт по индексу."""
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])
+
+
+def extreme(queryset, aggregate):
+    """Значение aggregate по queryset; в шардах - по всем шардам.
+
+    Каждый Max или Min - отдельный запрос: один агрегат SQLite берёт
+    из края индекса, не читая таблицу.
+    """
+    values = [
+        part.aggregate(value=aggregate)['value']
+        for part in shards.scatter(queryset.order_by())
+    ]
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return min(values) if isinstance(aggregate, Min) else max(values)
+
+
+def feed_version(queryset):
+    """Даты последней публикации и последней правки постов queryset."""
+    return (
+        extreme(queryset, Max('pub_date')),
+        extreme(queryset, Max('edited')),
+    )
+
+
+def index_version():
+    return (*feed_version(Post.objects.all()), removal())
+
+
+def group_version(slug):
+    # Группа - в основной базе, её посты в шардах - отдельными запросами
+    row = first_row(
+        Group.objects.filter(slug=slug)
+        .values_list('pk', 'posts_count', 'title', 'description')
+    )
+    if row is None:
+        return None
+    posts = Post.objects.filter(group_id=row[0])
+    # Самый старый горячий пост меняется при переносе хвоста в архив
+    first = extreme(posts, Min('pub_date'))
+    return (*feed_version(posts), first, *row[1:])
+
+
+def profile_version(username):
+    # Профиль выводит и архив, поэтому перенос в архив его не меняет,
+    # а удаления видны по posts_count
+    row = first_row(
+        Profile.objects.filter(user__username=username).values_list(
+            'user', 'posts_count', 'followers_count', 'following_count'
+        )
+    )
+    if row is None:
+        return None
+    author_id = row[0]
+    posts = Post.objects.filter(author_id=author_id)
+    if shards.enabled():
+        posts = posts.using(shards.for_author(author_id))
+    return (*feed_version(posts), *row[1:])
+
+
+def post_version(post_id):
+    # Комментарии лежат в шарде своего поста, подзапрос идёт туда же
+    comments = Comment.objects.filter(post=OuterRef('pk'))
+    return first_row(
+        shards.of_post(Post.objects, post_id).filter(pk=post_id)
+        .annotate(last=latest(comments, 'created'))
+        .values_list('pub_date', 'edited', 'last', 'comments_count')
+    )
+
+
+def version(name, compute, *args):
+    """Версия страницы из кэша текущего поколения.
+
+    Первые значения версии - даты (или None), остальное - счётчики и
+    поля, которые выводит страница.
+    """
+    key, timeout = replica_key(
+        f'posts:version:{generation()}:{name}:{args!r}',
+        settings.FEED_CACHE_TIMEOUT,
+    )
+    value = cache.get(key)
+    if value is None:
+        value = compute(*args) or (None,)
+        cache.set(key, value, timeout)
+    return value
+
+
+def viewer(request):
+    """Состояние авторизации: от него зависят шапка и кнопки страниц."""
+    if request.user.is_authenticated:
+        return request.user.pk
+    return 'anonymous'
+
+
+def conditional_page(name, compute):
+    """condition() для страницы: ETag и Last-Modified из версии данных.
+
+    compute(**kwargs) получает именованные аргументы представления и
+    возвращает кортеж версии. Last-Modified не замечает удалений, их
+    ловит только ETag: браузеры присылают If-None-Match вместе с
+    If-Modified-Since, и condition() проверяет его первым.
+    """
+    def page_version(kwargs):
+        return version(name, compute, *kwargs.values())
+
+    def etag(request, **kwargs):
+        raw = (
+            f'{page_version(kwargs)!r}|{viewer(request)}'
+            f'|{request.get_full_path()}'
+        )
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def last_modified(request, **kwargs):
+        dates = [
+            value for value in page_version(kwargs)
+            if isinstance(value, dt.datetime)
+        ]
+        return max(dates, default=None)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
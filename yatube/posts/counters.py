@@ -0,0 +1,130 @@
+"""Денормализованные счётчики постов, комментариев и подписок."""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Profile
+
+from . import shards
+from .models import ArchivedPost, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# (модель, счётчик, что считаем, поле связи, поле модели для связи);
+# посты в профилях и группах считаются вместе с архивными
+COUNTERS = (
+    (Post, 'comments_count', (Comment,), 'post', 'pk'),
+    (Group, 'posts_count', (Post, ArchivedPost), 'group', 'pk'),
+    (Profile, 'posts_count', (Post, ArchivedPost), 'author', 'user'),
+    (Profile, 'followers_count', (Follow,), 'author', 'user'),
+    (Profile, 'following_count', (Follow,), 'user', 'user'),
+)
+
+
+def profile_of(user):
+    """Профиль пользователя; если его нет (пользователь загружен без
+    сигналов), создаётся с настоящими значениями счётчиков."""
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        pass
+    profile, created = Profile.objects.get_or_create(user=user)
+    if created:
+        for model, field, sources, lookup, outer in COUNTERS:
+            if model is Profile:
+                setattr(profile, field, sum(
+                    part.filter(**{lookup: user.pk}).count()
+                    for source in sources
+                    for part in shards.scatter(source.objects.all())
+                ))
+        profile.save()
+    user.profile = profile
+    return profile
+
+
+def change(queryset, field, delta):
+    """Атомарно сдвигает счётчик на delta, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(sources, lookup, outer):
+    """Выражение с настоящим числом связанных записей в sources."""
+    total = None
+    for source in sources:
+        counted = (
+            source.objects.filter(**{lookup: OuterRef(outer)})
+            .order_by()
+            .values(lookup)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        count = Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+        total = count if total is None else total + count
+    return total
+
+
+def sharded(model):
+    return shards.enabled() and model._meta.label_lower in shards.SHARDED
+
+
+def repair_in(queryset, field, actual, dry_run):
+    """Исправляет field в queryset по выражению actual; возвращает число
+    расхождений."""
+    drifted = queryset.annotate(actual=actual).exclude(**{field: F('actual')})
+    count = drifted.count()
+    if not dry_run:
+        queryset.filter(pk__in=drifted.values('pk')).update(**{field: actual})
+    return count
+
+
+def repair_gathered(model, field, sources, lookup, outer, dry_run):
+    """Как repair_in, но записи из sources считаются в каждом шарде
+    отдельно: подзапрос из основной базы в шард не дотянется."""
+    totals = Counter()
+    for source in sources:
+        for part in shards.scatter(source.objects.all()):
+            totals.update(dict(
+                part.order_by().values_list(lookup).annotate(Count('pk'))
+            ))
+    drifted = [
+        (pk, totals[key])
+        for pk, key, value in model.objects.values_list('pk', outer, field)
+        if totals[key] != value
+    ]
+    if not dry_run:
+        for pk, total in drifted:
+            model.objects.filter(pk=pk).update(**{field: total})
+    return len(drifted)
+
+
+def repair(dry_run=False):
+    """Пересчитывает счётчики и возвращает число расхождений по каждому."""
+    missing = User.objects.filter(profile__isnull=True)
+    report = {'users.Profile': missing.count()}
+    if not dry_run:
+        Profile.objects.bulk_create(
+            Profile(user_id=pk) for pk in missing.values_list('pk', flat=True)
+        )
+    for model, field, sources, lookup, outer in COUNTERS:
+        if sharded(model):
+            # Комментарии лежат в шарде своего поста
+            drifted = sum(
+                repair_in(part, field,
+                          actual_count(sources, lookup, outer), dry_run)
+                for part in shards.split(model.objects.all())
+            )
+        elif any(sharded(source) for source in sources):
+            drifted = repair_gathered(
+                model, field, sources, lookup, outer, dry_run
+            )
+        else:
+            drifted = repair_in(
+                model.objects.all(), field,
+                actual_count(sources, lookup, outer), dry_run,
+            )
+        report[f'{model._meta.label}.{field}'] = drifted
+    return report
@@ -0,0 +1,192 @@
+"""Потоковая выгрузка постов, комментариев и подписок в NDJSON или CSV.
+
+Таблица читается порциями по ключу (дата, id): каждая порция - отдельный
+запрос с условием «после последней строки прошлой порции», без OFFSET
+и без загрузки таблицы в память. Строки сразу превращаются в текст,
+при необходимости сжимаются в gzip и отдаются кусками, так что память
+не зависит от размера таблицы.
+
+Посты и комментарии выгружаются вместе с архивными (posts.archive):
+строки обеих таблиц сливаются по тому же ключу.
+
+since выгружает только записи не раньше указанного момента. У подписок
+даты нет, они выгружаются целиком. Посты и комментарии выгружаются
+только без шардов.
+"""
+import csv
+import datetime as dt
+import heapq
+import io
+import json
+import zlib
+from collections import namedtuple
+from itertools import chain
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import shards
+from .models import ArchivedComment, ArchivedPost, Comment, Follow, Post
+
+CHUNK_SIZE = 2000
+# Сколько текста копить перед тем, как отдать кусок потока
+BUFFER_SIZE = 64 * 1024
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# columns - пары (имя в выгрузке, поле для values_list); archive -
+# модель архива с теми же полями или None
+Table = namedtuple('Table', 'model archive date_field columns')
+
+TABLES = {
+    'posts': Table(Post, ArchivedPost, 'pub_date', (
+        ('id', 'pk'),
+        ('author', 'author__username'),
+        ('group', 'group__slug'),
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+        ('image', 'image'),
+        ('comments_count', 'comments_count'),
+    )),
+    'comments': Table(Comment, ArchivedComment, 'created', (
+        ('id', 'pk'),
+        ('post', 'post_id'),
+        ('author', 'author__username'),
+        ('text', 'text'),
+        ('created', 'created'),
+    )),
+    'follows': Table(Follow, None, None, (
+        ('id', 'pk'),
+        ('user', 'user__username'),
+        ('author', 'author__username'),
+    )),
+}
+
+
+def sharded(table):
+    """Таблица в шардах: в шарде у авторов и групп только заглушки,
+    поэтому такие таблицы не выгружаются."""
+    return (
+        shards.enabled()
+        and TABLES[table].model._meta.label_lower in shards.SHARDED
+    )
+
+
+def parse_since(value):
+    """Момент из ISO-даты или даты со временем; ValueError, если это
+    не дата."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Не дата: {value}')
+        moment = dt.datetime.combine(day, dt.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def rows(table, since=None, chunk_size=CHUNK_SIZE):
+    """Строки таблицы и её архива в порядке (дата, id) порциями по
+    chunk_size."""
+    model, archive, date_field, columns = TABLES[table]
+    order = (date_field, 'pk') if date_field else ('pk',)
+    lookups = [lookup for _, lookup in columns]
+    key_positions = [lookups.index(field) for field in order]
+
+    def key(row):
+        return [row[position] for position in key_positions]
+
+    streams = []
+    for source in (model, archive):
+        if source is None:
+            continue
+        queryset = source.objects.order_by(*order).values_list(*lookups)
+        if since is not None and date_field:
+            queryset = queryset.filter(**{f'{date_field}__gte': since})
+        streams.append(chunked(queryset, order, key, chunk_size))
+    return heapq.merge(*streams, key=key)
+
+
+def chunked(queryset, order, key, chunk_size):
+    """Строки queryset порциями по ключу key(row) в порядке order."""
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(after(order, last))
+        count = 0
+        for row in chunk[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            yield row
+        if count < chunk_size:
+            return
+        last = key(row)
+
+
+def after(order, key):
+    """Условие «строго после key» для сортировки order по возрастанию."""
+    if len(order) == 1:
+        return Q(pk__gt=key[0])
+    field, value, pk = order[0], key[0], key[1]
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+
+
+def plain(value):
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+    return value
+
+
+def ndjson_lines(names, rows):
+    for row in rows:
+        yield json.dumps(
+            dict(zip(names, map(plain, row))), ensure_ascii=False
+        ) + '\n'
+
+
+def csv_lines(names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for values in chain([names], rows):
+        writer.writerow([plain(value) for value in values])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def chunks(lines):
+    """Склеивает строки в куски байтов примерно по BUFFER_SIZE."""
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def gzipped(chunks):
+    # wbits=31 - формат gzip, а не голый zlib
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(table, format='ndjson', since=None, compress=False,
+           chunk_size=CHUNK_SIZE):
+    """Выгрузка таблицы кусками байтов; compress - сжатие в gzip."""
+    names = [name for name, _ in TABLES[table].columns]
+    lines = (ndjson_lines if format == 'ndjson' else csv_lines)(
+        names, rows(table, since, chunk_size)
+    )
+    data = chunks(lines)
+    return gzipped(data) if compress else data
@@ -0,0 +1,141 @@
+"""RSS и Atom: лента сайта, группы и автора.
+
+Посты берутся тем же for_feed(), что и на HTML-страницах, по индексам
+(дата, id); в шардах первые страницы шардов сливаются по дате. Готовый
+ответ кэшируется в поколении кэша лент, поэтому сохранение или
+удаление поста сразу даёт новую ленту, а до этого читатели получают её
+из кэша или 304 по ETag и Last-Modified.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from . import conditional
+from .cache import generation
+from .models import Group, Post
+from .paginators import head
+
+User = get_user_model()
+TITLE_LENGTH = 60
+
+
+class LatestPostsFeed(Feed):
+    title = 'Yatube: последние посты'
+    description = 'Новые посты всех авторов'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def items(self):
+        return head(Post.objects.for_feed(), settings.FEED_ITEMS)
+
+    def item_title(self, post):
+        return Truncator(post.text).chars(TITLE_LENGTH)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', kwargs={'post_id': post.pk})
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return (post.group.title,) if post.group else ()
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_posts', kwargs={'slug': group.slug})
+
+    def items(self, group):
+        return head(group.posts.for_feed(), settings.FEED_ITEMS)
+
+
+class AuthorPostsFeed(LatestPostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Новые посты автора {author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', kwargs={'username': author.username})
+
+    def items(self, author):
+        return head(author.posts.for_feed(), settings.FEED_ITEMS)
+
+
+class AtomFeed:
+    """Atom-вариант ленты: описание уходит в subtitle."""
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self._get_dynamic_attr('description', obj)
+
+
+class LatestPostsAtomFeed(AtomFeed, LatestPostsFeed):
+    pass
+
+
+class GroupPostsAtomFeed(AtomFeed, GroupPostsFeed):
+    pass
+
+
+class AuthorPostsAtomFeed(AtomFeed, AuthorPostsFeed):
+    pass
+
+
+def cached(feed, name, version):
+    """Представление ленты: условный GET по версии страницы name
+    и готовый ответ из кэша текущего поколения."""
+    @conditional.conditional_page(name, version)
+    def view(request, **kwargs):
+        key = f'posts:feed:{generation()}:{request.get_full_path()}'
+        response = cache.get(key)
+        if response is None:
+            response = feed(request, **kwargs)
+            cache.set(key, response, settings.FEED_CACHE_TIMEOUT)
+        return response
+    return view
+
+
+index_rss = cached(
+    LatestPostsFeed(), 'index', conditional.index_version
+)
+index_atom = cached(
+    LatestPostsAtomFeed(), 'index', conditional.index_version
+)
+group_rss = cached(
+    GroupPostsFeed(), 'group_posts', conditional.group_version
+)
+group_atom = cached(
+    GroupPostsAtomFeed(), 'group_posts', conditional.group_version
+)
+author_rss = cached(
+    AuthorPostsFeed(), 'profile', conditional.profile_version
+)
+author_atom = cached(
+    AuthorPostsAtomFeed(), 'profile', conditional.profile_version
+)
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import archive, shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые посты с комментариями в архивные таблицы '
+        'пакетами в отдельных транзакциях'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Возраст поста для архива; по умолчанию ARCHIVE_AFTER_DAYS',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Постов в транзакции; по умолчанию ARCHIVE_BATCH_SIZE',
+        )
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Остановиться после стольких пакетов',
+        )
+
+    def handle(self, *args, **options):
+        if shards.enabled():
+            raise CommandError('Архив не поддерживает шарды постов')
+        days = options['days']
+        if days is None:
+            days = settings.ARCHIVE_AFTER_DAYS
+        before = archive.cutoff(days)
+        total = 0
+        for moved in archive.archive(
+            before, options['batch_size'], options['max_batches']
+        ):
+            total += moved
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Пакет: {moved}')
+        self.stdout.write(self.style.SUCCESS(
+            f'В архив перенесено постов старше {days} дн.: {total}'
+        ))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты, комментарии или подписки в NDJSON '
+        'или CSV, не загружая таблицу в память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=tuple(export.TABLES))
+        parser.add_argument(
+            '--format', choices=tuple(export.FORMATS), default='ndjson',
+        )
+        parser.add_argument(
+            '--since',
+            help='Только записи не раньше даты (ISO), для дозагрузки',
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку в gzip',
+        )
+        parser.add_argument(
+            '--output', help='Файл выгрузки; по умолчанию stdout',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=export.CHUNK_SIZE,
+            help='Строк в одном запросе к базе',
+        )
+
+    def handle(self, *args, **options):
+        if export.sharded(options['table']):
+            raise CommandError('Посты и комментарии в шардах не выгружаются')
+        try:
+            since = (
+                export.parse_since(options['since'])
+                if options['since'] else None
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options['gzip'] and not options['output']:
+            raise CommandError('Сжатая выгрузка пишется только в --output')
+        data = export.stream(
+            options['table'], options['format'], since,
+            compress=options['gzip'], chunk_size=options['chunk_size'],
+        )
+        if not options['output']:
+            for chunk in data:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        with open(options['output'], 'wb') as output:
+            for chunk in data:
+                output.write(chunk)
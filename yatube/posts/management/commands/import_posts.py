@@ -0,0 +1,72 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт посты автора из файла JSON (массив) или NDJSON '
+        '(объект на строку) пакетами через bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с постами, - для stdin')
+        parser.add_argument(
+            '--author', required=True, help='Username автора постов',
+        )
+        parser.add_argument(
+            '--format', choices=('json', 'ndjson'),
+            help='Формат файла; по умолчанию по расширению',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Постов в транзакции; по умолчанию BULK_BATCH_SIZE',
+        )
+        parser.add_argument(
+            '--results', help='Куда записать результаты по постам в NDJSON',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["author"]}')
+        path = options['path']
+        ndjson = options['format'] == 'ndjson' or (
+            options['format'] is None and path.endswith(('.ndjson', '.jsonl'))
+        )
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        results = open(options['results'], 'w') if options['results'] else None
+        try:
+            if ndjson:
+                items = bulk.read_ndjson(source)
+            else:
+                items = bulk.read_json(source.read())
+            created = failed = 0
+            for result in bulk.create(author, items, options['batch_size']):
+                if results:
+                    results.write(json.dumps(result, ensure_ascii=False))
+                    results.write('\n')
+                if 'id' in result:
+                    created += 1
+                else:
+                    failed += 1
+                    self.stderr.write(
+                        f'#{result["index"]}: {result["errors"]}'
+                    )
+        except bulk.ParseError as error:
+            raise CommandError(str(error))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if results:
+                results.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано постов: {created}, отклонено: {failed}'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов и комментариев'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError(
+                'Полнотекстовый поиск работает только на SQLite без шардов'
+            )
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано: {indexed}'))
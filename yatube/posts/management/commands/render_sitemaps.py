@@ -0,0 +1,66 @@
+import os
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from posts.sitemaps import SITEMAPS
+
+# get_urls() нужен только домен сайта
+StaticSite = namedtuple('StaticSite', 'domain')
+
+
+def write(path, content):
+    """Пишет файл целиком или никак: веб-сервер не увидит половину."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as output:
+        output.write(content)
+    os.replace(temporary, path)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заранее генерирует карту сайта в статические файлы: '
+        'sitemap.xml и по файлу на страницу каждого раздела'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Каталог для файлов карты')
+        parser.add_argument(
+            '--domain', required=True, help='Домен сайта в адресах',
+        )
+        parser.add_argument(
+            '--protocol', choices=('http', 'https'), default='https',
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Откуда раздаются файлы карты; по умолчанию корень сайта',
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output'], exist_ok=True)
+        site = StaticSite(options['domain'])
+        protocol = options['protocol']
+        base_url = options['base_url'] or f'{protocol}://{site.domain}/'
+        files = []
+        for section, sitemap_class in SITEMAPS.items():
+            sitemap = sitemap_class()
+            for number in range(1, sitemap.paginator.num_pages + 1):
+                urls = sitemap.get_urls(
+                    page=number, site=site, protocol=protocol
+                )
+                if not urls:
+                    continue
+                name = f'sitemap-{section}-{number}.xml'
+                write(
+                    os.path.join(options['output'], name),
+                    render_to_string('sitemap.xml', {'urlset': urls}),
+                )
+                files.append(base_url + name)
+        write(
+            os.path.join(options['output'], 'sitemap.xml'),
+            render_to_string('sitemap_index.xml', {'sitemaps': files}),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Страниц карты: {len(files)}'
+        ))
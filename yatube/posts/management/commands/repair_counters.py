@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import repair
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        report = repair(dry_run=options['dry_run'])
+        for counter, drifted in report.items():
+            self.stdout.write(f'{counter}: {drifted}')
+        total = sum(report.values())
+        if options['dry_run']:
+            self.stdout.write(f'Расхождений: {total}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено: {total}'))
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts import shards
+from posts.cache import bump_generation
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает посты и комментарии по шардам из POST_SHARDS: '
+        'после включения шардов, добавления или удаления баз'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*',
+            help='Базы, откуда переносить; по умолчанию основная и шарды',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Постов, читаемых за раз из базы',
+        )
+
+    def handle(self, *args, **options):
+        if not shards.enabled():
+            raise CommandError('Шарды не включены: POST_SHARDS пуст')
+        sources = list(dict.fromkeys(
+            options['sources'] or [DEFAULT_DB_ALIAS, *settings.POST_SHARDS]
+        ))
+        unknown = [alias for alias in sources if alias not in connections]
+        if unknown:
+            raise CommandError(f'Нет баз: {", ".join(unknown)}')
+        shards.reserve_existing(sources)
+        total = 0
+        for alias in sources:
+            moved, rekeyed = shards.move(alias, options['batch_size'])
+            total += moved
+            self.stdout.write(
+                f'{alias}: перенесено {moved}, новый id у {rekeyed}'
+            )
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS(f'Перенесено постов: {total}'))
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import shards
+from posts.cache import bump_generation
+from posts.models import Post
+from posts.thumbnails import generate
+from posts.variants import build_variants
+
+
+def warm(post):
+    pk, name, image_variants = post
+    generate(name)
+    if not image_variants:
+        build_variants(pk, name)
+
+
+def warm_in_thread(post):
+    try:
+        warm(post)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Заранее генерирует миниатюры и адаптивные копии '
+        'для всех картинок постов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.POST_THUMBNAIL_WORKERS,
+            help='Сколько картинок обрабатывать параллельно',
+        )
+
+    def handle(self, *args, **options):
+        posts = chain.from_iterable(
+            part.values_list('pk', 'image', 'image_variants').iterator()
+            for part in shards.scatter(Post.objects.exclude(image=''))
+        )
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                done = sum(1 for _ in pool.map(warm_in_thread, posts))
+        else:
+            done = sum(1 for _ in map(warm, posts))
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS(f'Картинок готово: {done}'))
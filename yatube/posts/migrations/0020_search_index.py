@@ -0,0 +1,37 @@
+from django.db import migrations
+
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5("
+    "text, kind UNINDEXED, post_id UNINDEXED, "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+FILL_INDEX = (
+    "INSERT INTO posts_search(rowid, text, kind, post_id) "
+    "SELECT id * 2, text, 'post', id FROM posts_post "
+    "UNION ALL "
+    "SELECT id * 2 + 1, text, 'comment', post_id FROM posts_comment "
+    "WHERE post_id IS NOT NULL"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(FILL_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_comment_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardTicket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+    ]
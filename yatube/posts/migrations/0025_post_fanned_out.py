@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_popular(apps, schema_editor):
+    # Посты нынешних популярных авторов по лентам не раскладывались
+    Post = apps.get_model('posts', 'Post')
+    Profile = apps.get_model('users', 'Profile')
+    popular = Profile.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values('user')
+    Post.objects.filter(author__in=popular).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_archive'),
+        ('users', '0002_fill_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False, help_text='Ложь - пост популярного автора, ленты подписок подмешивают его при чтении', verbose_name='Разложен по лентам'),
+        ),
+        migrations.RunPython(mark_popular, migrations.RunPython.noop),
+    ]
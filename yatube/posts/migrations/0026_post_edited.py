@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:02
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def fill_edited(apps, schema_editor):
+    # Старые посты считаем не правленными после публикации
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.using(schema_editor.connection.alias)
+    posts.update(edited=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_post_fanned_out'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='edited',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Когда пост последний раз сохраняли; по ней меняется версия страниц с постом', verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_edited, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-edited'], name='post_edited_idx'),
+        ),
+    ]
@@ -1,7 +1,11 @@
+import json
+
 from django.db import models
 
 from django.contrib.auth import get_user_model
 
+from . import shards
+
 User = get_user_model()
 
 
@@ -20,12 +24,61 @@ class Group(models.Model):
         'Описание группы',
         help_text='Описание новой группы'
     )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False,
+        help_text='Сколько постов опубликовано в группе'
+    )
 
     def __str__(self):
         return self.title
 
 
-class Post(models.Model):
+class ShardedQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # QuerySet.create сохраняет в self.db, выбранную без объекта;
+        # в шардах база зависит от автора или поста
+        if shards.enabled() and self._db is None and not self._hints:
+            obj = self.model(**kwargs)
+            obj.save(force_insert=True)
+            return obj
+        return super().create(**kwargs)
+
+
+class PostQuerySet(ShardedQuerySet):
+    # Поля, которые выводят шаблоны лент
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image', 'image_variants', 'comments_count',
+        'author', 'group',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__title', 'group__slug',
+    )
+
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним запросом с постами."""
+        if shards.enabled():
+            return self.prefetch_related('author', 'group')
+        return self.select_related('author', 'group').only(
+            *self.FEED_FIELDS
+        )
+
+
+class PostMixin:
+    """Общее для поста и его копии в архиве."""
+
+    def __str__(self):
+        return self.text[:15]
+
+    @property
+    def variants(self):
+        """Уменьшенные копии картинки: width, height, format, name."""
+        if not self.image_variants:
+            return []
+        return json.loads(self.image_variants)
+
+
+class Post(PostMixin, models.Model):
     text = models.TextField(
         'Текст поста',
         help_text='Текст нового поста'
@@ -35,6 +88,12 @@ class Post(models.Model):
         auto_now_add=True,
         help_text='Дата публикации нового поста'
     )
+    edited = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        help_text='Когда пост последний раз сохраняли; по ней меняется '
+                  'версия страниц с постом'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -57,12 +116,46 @@ class Post(models.Model):
         blank=True,
         help_text='Картинка поста'
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        default='',
+        editable=False,
+        help_text='JSON со списком уменьшенных копий картинки'
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+        help_text='Сколько комментариев оставлено к посту'
+    )
+    fanned_out = models.BooleanField(
+        'Разложен по лентам',
+        default=True,
+        editable=False,
+        help_text='Ложь - пост популярного автора, ленты подписок '
+                  'подмешивают его при чтении'
+    )
 
-    class Meta:
-        ordering = ('-pub_date',)
+    objects = PostQuerySet.as_manager()
 
-    def __str__(self):
-        return self.text[:15]
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(fields=('-edited',), name='post_edited_idx'),
+        )
 
 
 class Comment(models.Model):
@@ -92,6 +185,21 @@ class Comment(models.Model):
         help_text='Дата комментария поста'
     )
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=('created', 'id'),
+                name='comment_created_idx'
+            ),
+        )
+
     def __str__(self):
         return self.text[:15]
 
@@ -119,6 +227,144 @@ class Follow(models.Model):
                 name='unique_follow'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+        help_text='Пользователь, в ленту которого попал пост'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+        help_text='Пост из ленты подписок'
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+        help_text='Копия даты публикации поста для обрезки ленты'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.post_id} в ленте {self.user_id}'
+
+
+class ShardTicket(models.Model):
+    """Номера для id постов и комментариев в шардах (см. posts.shards)."""
+
+    def __str__(self):
+        return str(self.pk)
+
+
+class ArchivedPost(PostMixin, models.Model):
+    """Пост старше ARCHIVE_AFTER_DAYS, перенесённый из Post с тем же id
+    (см. posts.archive). Только для чтения."""
+    text = models.TextField('Текст поста')
+    pub_date = models.DateTimeField('Дата публикации')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='archived_posts',
+        verbose_name='Группа',
+    )
+    image = models.ImageField('Картинка', upload_to='posts/', blank=True)
+    image_variants = models.TextField(
+        'Варианты картинки', blank=True, default=''
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='archived_post_author_idx'
+            ),
+        )
+
+
+class ArchivedComment(models.Model):
+    """Комментарий архивного поста с тем же id, что был у Comment."""
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+        verbose_name='Автор',
+    )
+    text = models.TextField('Текст комментария')
+    created = models.DateTimeField('Дата комментария')
+
+    class Meta:
+        ordering = ('created', 'id')
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='archived_comment_post_idx'
+            ),
+        )
+
+    def __str__(self):
+        return self.text[:15]
+
+
+class MovedPost(models.Model):
+    """Прежний id поста, получившего новый id при раскладке по шардам
+    (posts.shards.copy_posts): по нему старые адреса ведут на новые."""
+    old_id = models.PositiveIntegerField('Прежний id', primary_key=True)
+    new_id = models.PositiveIntegerField('Новый id', db_index=True)
+
+    class Meta:
+        verbose_name = 'Перенесённый пост'
+        verbose_name_plural = 'Перенесённые посты'
+
+    def __str__(self):
+        return f'{self.old_id} -> {self.new_id}'
@@ -0,0 +1,266 @@
+import base64
+import binascii
+import datetime as dt
+import heapq
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import shards
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    values = [
+        # isoformat() сохраняет микросекунды, в отличие от DjangoJSONEncoder
+        value.isoformat() if isinstance(value, dt.datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора; для испорченного токена - None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    return values
+
+
+class KeysetPage(Page):
+    """Страница без общего числа записей: только «назад» и «вперёд»."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, number, paginator,
+                 has_next=False, has_previous=False):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Keyset page {self.number}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0])
+
+
+class KeysetPaginator(Paginator):
+    """Пагинация по ключу (field, pk) без COUNT(*) и OFFSET.
+
+    Курсоры ``after``/``before`` указывают на последнюю и первую запись
+    соседней страницы, поэтому стоимость запроса не зависит от глубины.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date',
+                 descending=True):
+        self.field = field
+        self.descending = descending
+        prefix = '-' if descending else ''
+        object_list = object_list.order_by(f'{prefix}{field}', f'{prefix}pk')
+        super().__init__(object_list, per_page)
+
+    def cursor_for(self, obj):
+        return encode_cursor([getattr(obj, self.field), obj.pk])
+
+    def _parse(self, token):
+        values = decode_cursor(token) if token else None
+        if values is None:
+            return None
+        model_field = self.object_list.model._meta.get_field(self.field)
+        try:
+            return model_field.to_python(values[0]), int(values[1])
+        except (ValidationError, TypeError, ValueError):
+            return None
+
+    def _beyond(self, value, pk, forward):
+        """Условие «после курсора» в направлении forward."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def after_for(self, obj):
+        """Курсор after страницы, на которой оказывается obj.
+
+        Страницы отсчитываются от начала по per_page записей, как при
+        переходах «Показать ещё»; для первой страницы - None.
+        """
+        key = getattr(obj, self.field), obj.pk
+        before = self.object_list.filter(self._beyond(*key, False)).count()
+        start = before - before % self.per_page
+        if not start:
+            return None
+        return self.cursor_for(self.object_list[start - 1])
+
+    def get_page(self, after=None, before=None):
+        """Возвращает страницу после курсора after или перед before.
+
+        Некорректный курсор, как и в Paginator.get_page, ведёт на первую
+        страницу.
+        """
+        limit = self.per_page + 1
+        cursor = self._parse(before)
+        if cursor is not None:
+            rows = list(
+                self.object_list.filter(self._beyond(*cursor, False))
+                .reverse()[:limit]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(rows, f'b{before}', self,
+                              has_next=True, has_previous=has_previous)
+        cursor = self._parse(after)
+        queryset = self.object_list
+        if cursor is not None:
+            queryset = queryset.filter(self._beyond(*cursor, True))
+        rows = list(queryset[:limit])
+        return KeysetPage(
+            rows[:self.per_page],
+            f'a{after}' if cursor is not None else 1,
+            self,
+            has_next=len(rows) > self.per_page,
+            has_previous=cursor is not None,
+        )
+
+
+class MergedPaginator:
+    """Страница по ключу (field, pk) из нескольких querysets.
+
+    Каждый queryset отдаёт свою страницу по тому же курсору, страницы
+    сливаются по ключу, и лишнее отрезается: запросов столько же,
+    сколько querysets, на любой глубине.
+    """
+
+    def __init__(self, querysets, per_page, field='pub_date',
+                 descending=True):
+        self.paginators = [
+            KeysetPaginator(queryset, per_page, field, descending)
+            for queryset in querysets
+        ]
+        self.per_page = per_page
+        self.field = field
+        self.descending = descending
+
+    def get_page(self, after=None, before=None):
+        pages = [
+            paginator.get_page(after=after, before=before)
+            for paginator in self.paginators
+        ]
+        rows = list(heapq.merge(
+            *(page.object_list for page in pages),
+            key=lambda obj: (getattr(obj, self.field), obj.pk),
+            reverse=self.descending,
+        ))
+        paginator = self.paginators[0]
+        if paginator._parse(before) is not None:
+            return KeysetPage(
+                rows[-self.per_page:], f'b{before}', paginator,
+                has_next=True,
+                has_previous=(
+                    len(rows) > self.per_page
+                    or any(page.has_previous() for page in pages)
+                ),
+            )
+        forward = paginator._parse(after) is not None
+        return KeysetPage(
+            rows[:self.per_page], f'a{after}' if forward else 1, paginator,
+            has_next=(
+                len(rows) > self.per_page
+                or any(page.has_next() for page in pages)
+            ),
+            has_previous=forward,
+        )
+
+
+class ChainedList:
+    """Querysets друг за другом как одна последовательность для
+    Paginator: срез читает только те части, в которые попал."""
+
+    def __init__(self, *parts):
+        self.parts = parts
+
+    @cached_property
+    def counts(self):
+        return [part.count() for part in self.parts]
+
+    def count(self):
+        return sum(self.counts)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        start, stop, _ = item.indices(self.count())
+        rows = []
+        for part, count in zip(self.parts, self.counts):
+            if start < count and stop > 0:
+                rows += part[max(start, 0):min(stop, count)]
+            start -= count
+            stop -= count
+        return rows
+
+
+def head(object_list, count):
+    """Первые count записей ленты; в шардах - из всех шардов."""
+    if shards.needs_scatter(object_list):
+        return MergedPaginator(shards.split(object_list), count).get_page()
+    return object_list[:count]
+
+
+def paginate(request, object_list, view_name, per_page=None,
+             archived=None):
+    """Страница для view_name в режиме из settings.PAGINATION_MODES.
+
+    archived - записи из архива, которые старше всех записей object_list
+    и идут после них.
+    """
+    per_page = per_page or settings.POSTS_ON_PAGE
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if shards.needs_scatter(object_list):
+        # В шардах лента по всем авторам - только по ключу
+        return MergedPaginator(shards.split(object_list), per_page).get_page(
+            after=after, before=before,
+        )
+    mode = settings.PAGINATION_MODES.get(
+        view_name, settings.PAGINATION_DEFAULT
+    )
+    if mode == 'keyset':
+        if archived is not None:
+            paginator = MergedPaginator([object_list, archived], per_page)
+        else:
+            paginator = KeysetPaginator(object_list, per_page)
+        return paginator.get_page(after=after, before=before)
+    if archived is not None:
+        object_list = ChainedList(object_list, archived)
+    paginator = Paginator(object_list, per_page)
+    return paginator.get_page(request.GET.get('page'))
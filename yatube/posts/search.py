@@ -0,0 +1,225 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Индекс - виртуальная таблица posts_search (см. миграцию 0020), которую
+сигналы обновляют при сохранении и удалении постов и комментариев.
+rowid записи: id * 2 для поста и id * 2 + 1 для комментария.
+
+Ищутся только горячие посты и комментарии: при переносе в архив
+(posts.archive) их записи из индекса удаляются, чтобы он оставался
+маленьким. Архивный пост открывается по адресу, есть в карте сайта,
+выгрузке и API, но не в поиске.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import shards
+from .models import Comment, Post
+from .paginators import KeysetPage, decode_cursor, encode_cursor
+
+TABLE = 'posts_search'
+# Маркеры подсветки, которых не бывает в тексте; заменяются после escape
+MARK_START, MARK_END = '\x02', '\x03'
+WORD = re.compile(r'\w+')
+
+
+def available():
+    """Индекс живёт в основной базе SQLite и не знает о шардах постов."""
+    return connection.vendor == 'sqlite' and not shards.enabled()
+
+
+def to_match(query):
+    """Запрос пользователя в безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки и ищется по префиксу.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query.lower()))
+
+
+def post_rowid(pk):
+    return pk * 2
+
+
+def comment_rowid(pk):
+    return pk * 2 + 1
+
+
+def _replace(rowid, text, kind, post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {TABLE}(rowid, text, kind, post_id) '
+            'VALUES (%s, %s, %s, %s)',
+            [rowid, text, kind, post_id],
+        )
+
+
+def _remove(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+
+
+def index_post(post):
+    _replace(post_rowid(post.pk), post.text, 'post', post.pk)
+
+
+def index_posts(posts):
+    """Добавляет в индекс новые посты одним executemany."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE}(rowid, text, kind, post_id) '
+            'VALUES (%s, %s, %s, %s)',
+            [(post_rowid(post.pk), post.text, 'post', post.pk)
+             for post in posts],
+        )
+
+
+def remove_post(pk):
+    _remove(post_rowid(pk))
+
+
+def remove_many(post_ids, comment_ids):
+    """Убирает из индекса посты и комментарии одним executemany."""
+    rowids = [post_rowid(pk) for pk in post_ids]
+    rowids += [comment_rowid(pk) for pk in comment_ids]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(rowid,) for rowid in rowids],
+        )
+
+
+def index_comment(comment):
+    if comment.post_id is not None:
+        _replace(comment_rowid(comment.pk), comment.text, 'comment',
+                 comment.post_id)
+
+
+def remove_comment(pk):
+    _remove(comment_rowid(pk))
+
+
+def rebuild():
+    """Перестраивает индекс по всем постам и комментариям.
+
+    Всё в одной транзакции: иначе SQLite фиксирует каждую вставку
+    отдельно.
+    """
+    posts = Post.objects.values_list('pk', 'text')
+    comments = Comment.objects.exclude(post=None).values_list(
+        'pk', 'text', 'post_id'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {TABLE}(rowid, text, kind, post_id) '
+            "VALUES (%s, %s, 'post', %s)",
+            ((post_rowid(pk), text, pk) for pk, text in posts.iterator()),
+        )
+        cursor.executemany(
+            f'INSERT INTO {TABLE}(rowid, text, kind, post_id) '
+            "VALUES (%s, %s, 'comment', %s)",
+            (
+                (comment_rowid(pk), text, post_id)
+                for pk, text, post_id in comments.iterator()
+            ),
+        )
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return posts.count() + comments.count()
+
+
+def matching_posts(query):
+    """Условие для фильтра pk__in: посты, чей текст подходит под query."""
+    return RawSQL(
+        f"SELECT post_id FROM {TABLE} WHERE {TABLE} MATCH %s "
+        "AND kind = 'post'",
+        [to_match(query) or '""'],
+    )
+
+
+class SearchHit:
+    def __init__(self, rowid, kind, post_id, score, snippet):
+        self.rowid = rowid
+        self.kind = kind
+        self.post_id = post_id
+        self.score = score
+        self.snippet = mark_safe(
+            escape(snippet)
+            .replace(MARK_START, '<mark>')
+            .replace(MARK_END, '</mark>')
+        )
+        self.post = None
+
+
+class SearchPaginator:
+    """Постраничная выдача по ключу (релевантность, rowid).
+
+    Интерфейс как у KeysetPaginator, поэтому страницы выводит тот же
+    posts/includes/paginator.html.
+    """
+
+    def __init__(self, query, per_page):
+        self.match = to_match(query)
+        self.per_page = per_page
+
+    def cursor_for(self, hit):
+        return encode_cursor([hit.score, hit.rowid])
+
+    def _parse(self, token):
+        values = decode_cursor(token) if token else None
+        if values is None:
+            return None
+        try:
+            return float(values[0]), int(values[1])
+        except (TypeError, ValueError):
+            return None
+
+    def _fetch(self, cursor, forward):
+        sql = (
+            f'SELECT rowid, kind, post_id, bm25({TABLE}), '
+            f"snippet({TABLE}, 0, %s, %s, '…', 16) "
+            f'FROM {TABLE} WHERE {TABLE} MATCH %s'
+        )
+        params = [MARK_START, MARK_END, self.match]
+        compare, order = ('>', 'ASC') if forward else ('<', 'DESC')
+        if cursor is not None:
+            sql += (
+                f' AND (bm25({TABLE}) {compare} %s '
+                f'OR (bm25({TABLE}) = %s AND rowid {compare} %s))'
+            )
+            params += [cursor[0], cursor[0], cursor[1]]
+        sql += f' ORDER BY bm25({TABLE}) {order}, rowid {order} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(sql, params)
+            return [SearchHit(*row) for row in db_cursor.fetchall()]
+
+    def get_page(self, after=None, before=None):
+        if not self.match:
+            return KeysetPage([], 1, self)
+        cursor = self._parse(before)
+        if cursor is not None:
+            hits = self._fetch(cursor, forward=False)
+            has_previous = len(hits) > self.per_page
+            hits = hits[:self.per_page][::-1]
+            page = KeysetPage(hits, f'b{before}', self,
+                              has_next=True, has_previous=has_previous)
+        else:
+            cursor = self._parse(after)
+            hits = self._fetch(cursor, forward=True)
+            page = KeysetPage(
+                hits[:self.per_page],
+                f'a{after}' if cursor is not None else 1,
+                self,
+                has_next=len(hits) > self.per_page,
+                has_previous=cursor is not None,
+            )
+        posts = Post.objects.for_feed().in_bulk(
+            {hit.post_id for hit in page.object_list}
+        )
+        for hit in page.object_list:
+            hit.post = posts.get(hit.post_id)
+        return page
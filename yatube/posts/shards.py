@@ -0,0 +1,316 @@
+"""Шардирование постов и комментариев по автору.
+
+Включается списком баз в settings.POST_SHARDS; пустой список - всё
+в основной базе, как раньше. Посты автора лежат в шарде его слота
+author_id % POST_SHARD_SLOTS, комментарии - в шарде своего поста.
+Слотов заметно больше, чем баз, и слот s живёт в базе
+POST_SHARDS[s % len(POST_SHARDS)], поэтому при добавлении баз
+переезжают данные (команда reshard), а не id.
+
+Id поста и комментария - номер из ShardTicket в основной базе,
+умноженный на число слотов, плюс слот: id уникален по всем шардам,
+а шард поста виден по его id без запросов. Посты, созданные до
+включения шардов, при раскладке получают такие id, а прежние id
+остаются в MovedPost: страница поста по старому адресу отвечает 301.
+
+Пользователи, группы, подписки и счётчики остаются в основной базе.
+В шардах у пользователей и групп есть только заглушки для внешних
+ключей, поэтому связанные записи берутся через prefetch_related
+из основной базы (см. related и PostQuerySet.for_feed). Ленты по всем
+авторам (главная, группа, подписки) собираются из страниц по ключу
+каждого шарда (paginators.MergedPaginator), а даты и числа по ним -
+из ответов всех шардов (scatter).
+
+Поиск, архив, выгрузка постов и комментариев и материализованные
+ленты работают только без шардов.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+
+from . import models
+from .cache import touch_sitemap
+
+SHARDED = {'posts.post', 'posts.comment'}
+STUB_PASSWORD = '!'
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def slot_alias(slot):
+    return settings.POST_SHARDS[slot % len(settings.POST_SHARDS)]
+
+
+def for_author(author_id):
+    """База с постами автора author_id."""
+    return slot_alias(author_id % settings.POST_SHARD_SLOTS)
+
+
+def for_post(post_id):
+    """База с постом post_id и его комментариями."""
+    return slot_alias(int(post_id) % settings.POST_SHARD_SLOTS)
+
+
+def of_post(queryset, post_id):
+    """queryset в шарде поста post_id; без шардов - как есть."""
+    return queryset.using(for_post(post_id)) if enabled() else queryset
+
+
+def split(queryset):
+    """Копии queryset для каждого шарда."""
+    return [
+        queryset.using(alias) for alias in dict.fromkeys(settings.POST_SHARDS)
+    ]
+
+
+def related(queryset, *fields):
+    """Связанные записи одним JOIN, а в шардах - отдельными запросами
+    к основной базе: в шарде у них только заглушки."""
+    if enabled():
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+def allocate(slot):
+    """Новый id в слоте slot."""
+    ticket = models.ShardTicket.objects.create()
+    return ticket.pk * settings.POST_SHARD_SLOTS + slot
+
+
+def reserve(max_id):
+    """Сдвигает номера ShardTicket за уже занятый id max_id."""
+    ticket = max_id // settings.POST_SHARD_SLOTS + 1
+    if not models.ShardTicket.objects.filter(pk__gte=ticket).exists():
+        models.ShardTicket.objects.create(pk=ticket)
+
+
+def ensure_stubs(alias, user_ids=(), group_ids=()):
+    """Заглушки пользователей и групп для внешних ключей шарда."""
+    User = get_user_model()
+    User.objects.using(alias).bulk_create(
+        [
+            User(pk=pk, username=f'stub-{pk}', password=STUB_PASSWORD)
+            for pk in set(user_ids)
+        ],
+        ignore_conflicts=True,
+    )
+    models.Group.objects.using(alias).bulk_create(
+        [
+            models.Group(pk=pk, title='', slug=f'stub-{pk}', description='')
+            for pk in set(group_ids) - {None}
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def delete_stubs(model, pk):
+    """Удаляет заглушку пользователя или группы во всех шардах.
+
+    Каскад основной базы до шардов не доходит; удаление заглушки
+    запускает его в шарде: посты и комментарии пользователя удаляются
+    с сигналами (счётчики, кэш), у постов группы она обнуляется.
+    """
+    for alias in dict.fromkeys(settings.POST_SHARDS):
+        model._default_manager.using(alias).filter(pk=pk).delete()
+
+
+def prepare(instance):
+    """Id и заглушки для нового поста или комментария шарда."""
+    if instance._meta.label_lower == 'posts.post':
+        slot = slot_of(instance)
+        ensure_stubs(slot_alias(slot), [instance.author_id],
+                     [instance.group_id])
+    else:
+        slot = instance.post_id % settings.POST_SHARD_SLOTS
+        ensure_stubs(slot_alias(slot), [instance.author_id])
+    instance.pk = allocate(slot)
+
+
+def prepare_posts(author_id, posts):
+    """Id и заглушки для пакета новых постов автора author_id; возвращает
+    базу, куда их вставлять."""
+    slot = author_id % settings.POST_SHARD_SLOTS
+    alias = slot_alias(slot)
+    ensure_stubs(alias, [author_id], [post.group_id for post in posts])
+    for post in posts:
+        post.pk = allocate(slot)
+    return alias
+
+
+def slot_of(post):
+    return post.author_id % settings.POST_SHARD_SLOTS
+
+
+def reserve_existing(aliases):
+    """Резервирует номера под все id постов и комментариев в aliases."""
+    ids = [0]
+    for alias in aliases:
+        for model in (models.Post, models.Comment):
+            ids.append(
+                model.objects.using(alias).aggregate(last=Max('pk'))['last']
+                or 0
+            )
+    reserve(max(ids))
+
+
+def move(alias, batch_size):
+    """Переносит посты базы alias, которым место в другом шарде, вместе
+    с комментариями. Id сохраняется, если его слот - слот автора (пост
+    уже жил в шардах), иначе выдаётся новый, а прежний записывается
+    в MovedPost. Перед переносом нужен reserve_existing по всем базам
+    с постами.
+
+    Возвращает (перенесено, с новым id).
+    """
+    moved = rekeyed = 0
+    last = 0
+    while True:
+        batch = list(
+            models.Post.objects.using(alias).filter(pk__gt=last)
+            .order_by('pk')[:batch_size]
+        )
+        if not batch:
+            return moved, rekeyed
+        last = batch[-1].pk
+        targets = defaultdict(list)
+        for post in batch:
+            target = slot_alias(slot_of(post))
+            if target != alias or post.pk % settings.POST_SHARD_SLOTS != (
+                    slot_of(post)):
+                targets[target].append(post)
+        for target, posts in targets.items():
+            rekeyed += copy_posts(alias, target, posts)
+            moved += len(posts)
+
+
+def remember_moves(moves):
+    """Записывает новые id постов {прежний: новый}; адреса, которые
+    вели на прежний id раньше, тоже ведут на новый."""
+    if not moves:
+        return
+    moved = models.MovedPost.objects.using(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        for old_id, new_id in moves.items():
+            moved.filter(new_id=old_id).update(new_id=new_id)
+        moved.bulk_create(
+            [models.MovedPost(old_id=old_id, new_id=new_id)
+             for old_id, new_id in moves.items()],
+            ignore_conflicts=True,
+        )
+
+
+def moved_id(post_id):
+    """Новый id поста с прежним id post_id или None."""
+    return (
+        models.MovedPost.objects.using(DEFAULT_DB_ALIAS)
+        .filter(old_id=post_id)
+        .values_list('new_id', flat=True)
+        .first()
+    )
+
+
+def copy_posts(alias, target, posts):
+    """Копирует посты с комментариями из alias в target и удаляет
+    их из alias; возвращает число постов с новым id."""
+    old_ids = [post.pk for post in posts]
+    comments = list(
+        models.Comment.objects.using(alias).filter(post_id__in=old_ids)
+    )
+    rekeyed = set()
+    new_ids = {}
+    for post in posts:
+        slot = slot_of(post)
+        if post.pk % settings.POST_SHARD_SLOTS != slot:
+            rekeyed.add(post.pk)
+            new_ids[post.pk] = allocate(slot)
+        else:
+            new_ids[post.pk] = post.pk
+    for comment in comments:
+        if comment.post_id in rekeyed:
+            comment.pk = allocate(new_ids[comment.post_id]
+                                  % settings.POST_SHARD_SLOTS)
+        comment.post_id = new_ids[comment.post_id]
+    for post in posts:
+        post.pk = new_ids[post.pk]
+    with transaction.atomic(using=target):
+        ensure_stubs(
+            target,
+            [post.author_id for post in posts]
+            + [comment.author_id for comment in comments],
+            [post.group_id for post in posts],
+        )
+        # Повтор после сбоя не дублирует посты с прежним id
+        models.Post.objects.using(target).bulk_create(
+            posts, ignore_conflicts=True
+        )
+        models.Comment.objects.using(target).bulk_create(
+            comments, ignore_conflicts=True
+        )
+    remember_moves({old_id: new_ids[old_id] for old_id in rekeyed})
+    with transaction.atomic(using=alias):
+        # Без сигналов: счётчики в основной базе не меняются от переезда
+        for model, lookup in (
+            (models.TimelineEntry, 'post_id__in'),
+            (models.Comment, 'post_id__in'),
+            (models.Post, 'pk__in'),
+        ):
+            model.objects.using(alias).filter(
+                **{lookup: old_ids}
+            )._raw_delete(alias)
+    touch_sitemap('posts', *rekeyed, *new_ids.values())
+    return len(rekeyed)
+
+
+def needs_scatter(queryset):
+    """Запрос по постам нескольких авторов: идёт во все шарды."""
+    return (
+        enabled()
+        and queryset.model._meta.label_lower == 'posts.post'
+        and queryset._db is None
+        and ShardRouter().shard(queryset.model, **queryset._hints) is None
+    )
+
+
+def scatter(queryset):
+    """Части queryset по шардам, если он идёт во все шарды, иначе
+    только он сам."""
+    return split(queryset) if needs_scatter(queryset) else [queryset]
+
+
+class ShardRouter:
+    def shard(self, model, instance=None, **hints):
+        """Шард модели model по подсказке instance или None."""
+        if instance is None:
+            return None
+        label = instance._meta.label_lower
+        if label == 'posts.post':
+            if instance.pk is not None:
+                return for_post(instance.pk)
+            return for_author(instance.author_id)
+        if label == 'posts.comment':
+            return for_post(instance.post_id)
+        if (label == settings.AUTH_USER_MODEL.lower()
+                and model._meta.label_lower == 'posts.post'):
+            return for_author(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not enabled():
+            return None
+        if model._meta.label_lower in SHARDED:
+            return self.shard(model, **hints)
+        instance = hints.get('instance')
+        if instance is not None and instance._meta.label_lower in SHARDED:
+            # Автор и группа поста - в основной базе, не в шарде поста
+            return DEFAULT_DB_ALIAS
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True if enabled() else None
@@ -0,0 +1,202 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Profile
+
+from . import search, shards, timeline
+from .cache import bump_generation, mark_removal, touch_sitemap
+from .counters import change
+from .models import ArchivedPost, Comment, Follow, Group, Post, User
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        change(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def prepare_shard(sender, instance, raw=False, **kwargs):
+    if not raw and shards.enabled() and instance.pk is None:
+        shards.prepare(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._saved_group_id = (
+            shards.of_post(Post.objects, instance.pk)
+            .filter(pk=instance.pk)
+            .values_list('group_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change(Profile.objects.filter(user=instance.author_id),
+               'posts_count', 1)
+        change_group(instance.group_id, 1)
+        return
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    if saved_group_id != instance.group_id:
+        change_group(saved_group_id, -1)
+        change_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=ArchivedPost)
+def uncount_post(sender, instance, **kwargs):
+    change(Profile.objects.filter(user=instance.author_id), 'posts_count', -1)
+    change_group(instance.group_id, -1)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post(sender, instance, **kwargs):
+    mark_removal()
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change(
+            shards.of_post(Post.objects, instance.post_id)
+            .filter(pk=instance.post_id),
+            'comments_count', 1,
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    change(
+        shards.of_post(Post.objects, instance.post_id)
+        .filter(pk=instance.post_id),
+        'comments_count', -1,
+    )
+
+
+def touch_group_posts(group_id):
+    # Ленты выводят название и адрес группы: для версий страниц это
+    # правка каждого поста группы
+    for part in shards.scatter(Post.objects.filter(group_id=group_id)):
+        part.update(edited=timezone.now())
+
+
+@receiver(post_save, sender=Group)
+def touch_changed_group(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        touch_group_posts(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def touch_deleted_group(sender, instance, **kwargs):
+    touch_group_posts(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def delete_from_shards(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS and shards.enabled():
+        shards.delete_stubs(sender, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change(Profile.objects.filter(user=instance.author_id),
+               'followers_count', 1)
+        change(Profile.objects.filter(user=instance.user_id),
+               'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    change(Profile.objects.filter(user=instance.author_id),
+           'followers_count', -1)
+    change(Profile.objects.filter(user=instance.user_id),
+           'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created and settings.TIMELINE_ENABLED:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and settings.TIMELINE_ENABLED:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    if settings.TIMELINE_ENABLED:
+        timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_feeds(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=ArchivedPost)
+def touch_post_sitemaps(sender, instance, **kwargs):
+    touch_sitemap('posts', instance.pk)
+    touch_sitemap(
+        'groups', instance.group_id,
+        getattr(instance, '_saved_group_id', None),
+    )
+    touch_sitemap('profiles', instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def touch_group_sitemap(sender, instance, **kwargs):
+    touch_sitemap('groups', instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def touch_profile_sitemap(sender, instance, **kwargs):
+    touch_sitemap('profiles', instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw and search.available():
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    if search.available():
+        search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw and search.available():
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    if search.available():
+        search.remove_comment(instance.pk)
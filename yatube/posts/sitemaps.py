@@ -0,0 +1,219 @@
+"""Карта сайта: индекс и страницы для постов, групп и профилей.
+
+Страница карты - диапазон первичных ключей: на странице n записи
+с id из ((n - 1) * limit, n * limit]. Такая страница читается запросом
+по ключу на таблицу, без COUNT и OFFSET, строки идут кортежами
+values_list через iterator(), без экземпляров моделей.
+
+Готовая страница кэшируется с меткой своего диапазона
+(posts.cache.sitemap_chunk), которую меняет запись в любую строку
+диапазона: пост меняет свою страницу и страницы своей группы и автора.
+Новые посты сбрасывают только последнюю страницу, а старые страницы
+отдаются из кэша без единого запроса к базе.
+
+Раздел постов включает архивные посты (posts.archive): id у них общие
+с горячими, и диапазоны обеих таблиц сливаются по id. В шардах
+страница постов собирается из диапазонов всех шардов, а у групп
+и профилей нет даты последнего поста.
+"""
+import hashlib
+import heapq
+import math
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sitemaps import Sitemap, views
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db.models import DateTimeField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+from . import shards
+from .cache import generation, sitemap_chunk
+from .models import ArchivedPost, Group, Post
+
+User = get_user_model()
+
+
+class RangePage:
+    def __init__(self, object_list, number):
+        self.object_list = object_list
+        self.number = number
+
+
+def parts(querysets):
+    """Части queryset или списка querysets по шардам."""
+    if not isinstance(querysets, (list, tuple)):
+        querysets = [querysets]
+    return [
+        part for queryset in querysets for part in shards.scatter(queryset)
+    ]
+
+
+class RangePaginator:
+    """Страницы по диапазонам id; пустые диапазоны дают пустые
+    страницы, число страниц - по наибольшему id в rows. Строки страниц
+    берутся из items. rows и items - queryset или список querysets
+    с общими id."""
+
+    def __init__(self, rows, per_page, items=None):
+        self.rows = parts(rows)
+        self.per_page = per_page
+        self.items = self.rows if items is None else parts(items)
+
+    @cached_property
+    def num_pages(self):
+        last = max(
+            part.aggregate(last=Max('pk'))['last'] or 0
+            for part in self.rows
+        )
+        return max(math.ceil(last / self.per_page), 1)
+
+    def bounds(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы - не число')
+        if number < 1 or number > self.num_pages:
+            raise EmptyPage('Такой страницы нет')
+        return (number - 1) * self.per_page, number * self.per_page
+
+    def page(self, number):
+        low, high = self.bounds(number)
+        # Id постов уникальны по всем шардам и архиву: диапазоны
+        # сливаются по id
+        rows = heapq.merge(*(
+            part.filter(pk__gt=low, pk__lte=high).order_by('pk')
+            .iterator(chunk_size=self.per_page)
+            for part in self.items
+        ))
+        return RangePage(rows, number)
+
+
+def latest_post(**lookup):
+    """Подзапрос с датой последнего поста по условию lookup; архивные
+    посты старше горячих и нужны, только если горячих нет. В шардах
+    даты нет (lastmod не выводится)."""
+    if shards.enabled():
+        return Value(None, output_field=DateTimeField())
+    return Coalesce(*(
+        Subquery(
+            model.objects.filter(**lookup).order_by('-pub_date')
+            .values('pub_date')[:1]
+        )
+        for model in (Post, ArchivedPost)
+    ))
+
+
+class ChunkedSitemap(Sitemap):
+    """Sitemap по строкам values_list (ключ для адреса, дата)."""
+    url_name = None
+    url_kwarg = None
+    date_field = None
+
+    @property
+    def limit(self):
+        return settings.SITEMAP_CHUNK_SIZE
+
+    @cached_property
+    def paginator(self):
+        return RangePaginator(self.rows(), self.limit, self.items())
+
+    def location(self, row):
+        return reverse(self.url_name, kwargs={self.url_kwarg: row[0]})
+
+    def lastmod(self, row):
+        return row[1]
+
+    def rows(self):
+        """Записи раздела без аннотаций - для числа страниц."""
+        raise NotImplementedError
+
+
+class PostSitemap(ChunkedSitemap):
+    url_name = 'posts:post_detail'
+    url_kwarg = 'post_id'
+    date_field = 'pub_date'
+
+    def rows(self):
+        # Архивные посты открываются по тем же адресам
+        return [Post.objects.all(), ArchivedPost.objects.all()]
+
+    def items(self):
+        return [rows.values_list('pk', 'pub_date') for rows in self.rows()]
+
+
+class GroupSitemap(ChunkedSitemap):
+    url_name = 'posts:group_posts'
+    url_kwarg = 'slug'
+    date_field = 'posts__pub_date'
+
+    def rows(self):
+        return Group.objects.all()
+
+    def items(self):
+        return self.rows().annotate(
+            last=latest_post(group=OuterRef('pk'))
+        ).values_list('slug', 'last')
+
+
+class ProfileSitemap(ChunkedSitemap):
+    url_name = 'posts:profile'
+    url_kwarg = 'username'
+    date_field = 'posts__pub_date'
+
+    def rows(self):
+        return User.objects.filter(is_active=True)
+
+    def items(self):
+        return self.rows().annotate(
+            last=latest_post(author=OuterRef('pk'))
+        ).values_list('username', 'last')
+
+
+# Классы, а не экземпляры: sitemap хранит состояние запроса
+SITEMAPS = {
+    'posts': PostSitemap,
+    'groups': GroupSitemap,
+    'profiles': ProfileSitemap,
+}
+
+
+def index(request):
+    """Индекс карты; меняется только с числом страниц разделов."""
+    key = (
+        f'posts:sitemap:{generation()}:{request.scheme}:'
+        f'{request.get_host()}:index'
+    )
+    response = cache.get(key)
+    if response is None:
+        response = views.index(
+            request, SITEMAPS, sitemap_url_name='posts:sitemap_section'
+        ).render()
+        cache.set(key, response, settings.FEED_CACHE_TIMEOUT)
+    return response
+
+
+def section(request, section):
+    """Страница раздела карты из кэша по метке её диапазона."""
+    if section not in SITEMAPS:
+        raise Http404
+    try:
+        page = int(request.GET.get('p', 1))
+    except ValueError:
+        raise Http404
+    # Номер за пределами раздела не найдётся в кэше, а sitemap() ответит
+    # на него 404
+    raw = (
+        f'{request.scheme}|{request.get_host()}|{section}|{page}'
+        f'|{sitemap_chunk(section, page)}'
+    )
+    key = f'posts:sitemap:{hashlib.sha1(raw.encode()).hexdigest()}'
+    response = cache.get(key)
+    if response is None:
+        response = views.sitemap(request, SITEMAPS, section=section).render()
+        cache.set(key, response, settings.SITEMAP_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,18 @@
+from django import template
+
+from posts.thumbnails import feed_thumbnail as get_feed_thumbnail
+from posts.variants import picture
+
+register = template.Library()
+
+
+@register.simple_tag
+def feed_thumbnail(image):
+    """Готовая миниатюра картинки поста или None."""
+    return get_feed_thumbnail(image)
+
+
+@register.simple_tag
+def post_picture(post):
+    """Источники для <picture> или None, пока копии не готовы."""
+    return picture(post)
@@ -0,0 +1,148 @@
+import datetime as dt
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import Profile
+
+from .. import export, search
+from ..counters import repair
+from ..models import ArchivedComment, ArchivedPost, Comment, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(ARCHIVE_AFTER_DAYS=30, POSTS_ON_PAGE=3)
+class ArchiveTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        now = timezone.now()
+        # Пять старых постов (старше 30 дней) и два свежих
+        cls.posts = []
+        for i in range(7):
+            post = Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group
+            )
+            days = 40 - i if i < 5 else 5 - i
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - dt.timedelta(days=days)
+            )
+            cls.posts.append(post)
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Старый комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ArchiveTest.user)
+
+    def archive(self, *args):
+        call_command('archive_posts', *args, stdout=StringIO())
+
+    def test_moves_old_posts_in_batches(self):
+        """Старые посты переезжают пакетами с комментариями и тем же id"""
+        self.archive('--batch-size', '2', '--max-batches', '1')
+        self.assertEqual(ArchivedPost.objects.count(), 2)
+        self.archive('--batch-size', '2')
+        self.assertEqual(
+            set(ArchivedPost.objects.values_list('pk', flat=True)),
+            {post.pk for post in self.posts[:5]},
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        archived = ArchivedComment.objects.get()
+        self.assertEqual(archived.pk, self.comment.pk)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(
+            Profile.objects.get(user=self.user).posts_count, 7
+        )
+        self.assertEqual(sum(repair(dry_run=True).values()), 0)
+        if search.available():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT count(*) FROM {search.TABLE} WHERE rowid = %s',
+                    [search.post_rowid(self.posts[0].pk)],
+                )
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_post_detail_reads_archive(self):
+        """Архивный пост открывается по старому адресу без формы"""
+        self.archive()
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.posts[0].pk})
+        )
+        self.assertContains(response, 'Пост 0')
+        self.assertContains(response, 'Старый комментарий')
+        self.assertTrue(response.context['archived'])
+        self.assertNotContains(response, 'Добавить комментарий')
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.posts[0].pk}),
+            {'text': 'Новый'},
+        )
+        self.assertFalse(ArchivedComment.objects.filter(text='Новый').exists())
+
+    def test_other_read_paths(self):
+        """Архив есть в выгрузке, карте сайта и API, но не в поиске"""
+        self.archive()
+        old = self.posts[0]
+        rows = list(export.rows('posts'))
+        self.assertEqual(
+            [row[0] for row in rows], [post.pk for post in self.posts]
+        )
+        comments = list(export.rows('comments'))
+        self.assertEqual([row[0] for row in comments], [self.comment.pk])
+        response = self.client.get(
+            reverse('posts:sitemap_section', kwargs={'section': 'posts'})
+        )
+        self.assertContains(response, f'/posts/{old.pk}/<')
+        data = self.client.get(
+            reverse('api:post', kwargs={'post_id': old.pk})
+        ).json()
+        self.assertEqual(data['text'], 'Пост 0')
+        data = self.client.get(
+            reverse('api:post_comments', kwargs={'post_id': old.pk})
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Старый комментарий'],
+        )
+        if search.available():
+            # Поиск - только по горячим постам: архив из индекса удаляется
+            response = self.client.get(
+                reverse('posts:post_search'), {'q': 'Пост'}
+            )
+            found = {hit.post_id for hit in response.context['page_obj']}
+            self.assertEqual(found, {post.pk for post in self.posts[5:]})
+
+    def test_profile_reads_both(self):
+        """Профиль листает горячие посты, а за ними архив"""
+        self.archive()
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        texts = []
+        for page in (1, 2, 3):
+            response = self.client.get(url, {'page': page})
+            texts += [post.text for post in response.context['page_obj']]
+        self.assertEqual(texts, [f'Пост {i}' for i in range(6, -1, -1)])
+        with override_settings(PAGINATION_MODES={'profile': 'keyset'}):
+            texts = []
+            params = {}
+            while True:
+                page = self.client.get(url, params).context['page_obj']
+                texts += [post.text for post in page]
+                if not page.has_next():
+                    break
+                params = {'after': page.next_cursor}
+        self.assertEqual(texts, [f'Пост {i}' for i in range(6, -1, -1)])
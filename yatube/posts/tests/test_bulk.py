@@ -0,0 +1,152 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from users.models import Profile
+
+from .. import archive, bulk, search
+from ..cache import generation
+from ..models import Follow, Group, Post, TimelineEntry
+from .test_thumbnails import SMALL_GIF
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_THUMBNAIL_ASYNC=False)
+class BulkCreateTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_results_in_input_order(self):
+        """Корректные посты создаются, ошибки возвращаются по позициям"""
+        results = list(bulk.create(BulkCreateTest.user, [
+            {'text': 'Первый', 'group': 'testovyij-slag'},
+            {'text': ''},
+            'не объект',
+            {'text': 'Второй', 'group': 'net-takoj'},
+            {'text': 'Третий'},
+        ], batch_size=2))
+        self.assertEqual(
+            [result['index'] for result in results], [0, 1, 2, 3, 4]
+        )
+        self.assertEqual(set(results[1]['errors']), {'text'})
+        self.assertEqual(set(results[2]['errors']), {'__all__'})
+        self.assertEqual(set(results[3]['errors']), {'group'})
+        first = Post.objects.get(pk=results[0]['id'])
+        self.assertEqual(first.group, BulkCreateTest.group)
+        self.assertEqual(Post.objects.get(pk=results[4]['id']).text, 'Третий')
+
+    def test_side_effects(self):
+        """Счётчики, поиск, ленты и кэш обновляются как при сигналах"""
+        Follow.objects.create(
+            user=BulkCreateTest.reader, author=BulkCreateTest.user
+        )
+        before = generation()
+        items = [
+            {'text': f'Импорт {i}', 'group': 'testovyij-slag'}
+            for i in range(3)
+        ]
+        with self.settings(TIMELINE_ENABLED=True):
+            results = list(bulk.create(BulkCreateTest.user, items))
+        ids = [result['id'] for result in results]
+        profile = Profile.objects.get(user=BulkCreateTest.user)
+        self.assertEqual(profile.posts_count, 3)
+        BulkCreateTest.group.refresh_from_db()
+        self.assertEqual(BulkCreateTest.group.posts_count, 3)
+        self.assertNotEqual(generation(), before)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=BulkCreateTest.reader
+            ).values_list('post_id', flat=True)),
+            set(ids),
+        )
+        if search.available():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT post_id FROM {search.TABLE} '
+                    f'WHERE {search.TABLE} MATCH %s',
+                    [search.to_match('импорт')],
+                )
+                found = {post_id for post_id, in cursor.fetchall()}
+            self.assertEqual(found, set(ids))
+
+    def test_queries_per_batch(self):
+        """Число запросов зависит от числа порций, а не постов"""
+        items = [{'text': f'Пост {i}'} for i in range(50)]
+        with self.assertNumQueries(6):
+            results = list(bulk.create(BulkCreateTest.user, items))
+        self.assertEqual(len(results), 50)
+
+    def test_ids_not_reused(self):
+        """Новые посты не получают id удалённых и архивных постов"""
+        Post.objects.create(author=BulkCreateTest.user, text='В архиве')
+        archive.archive_batch(timezone.now())
+        deleted = Post.objects.create(
+            author=BulkCreateTest.user, text='Удалён'
+        )
+        last = deleted.pk
+        deleted.delete()
+        results = list(bulk.create(BulkCreateTest.user, [{'text': 'Новый'}]))
+        self.assertEqual(results[0]['id'], last + 1)
+        self.assertEqual(Post.objects.create(
+            author=BulkCreateTest.user, text='Следующий'
+        ).pk, last + 2)
+
+    def test_image_reference(self):
+        """Картинка задаётся именем уже загруженного файла"""
+        name = default_storage.save(
+            'posts/imported.gif', ContentFile(SMALL_GIF)
+        )
+        broken = default_storage.save('posts/broken.gif', ContentFile(b'x'))
+        results = list(bulk.create(BulkCreateTest.user, [
+            {'text': 'С картинкой', 'image': name},
+            {'text': 'Не картинка', 'image': broken},
+            {'text': 'Чужой файл', 'image': '../settings.py'},
+            {'text': 'Нет файла', 'image': 'posts/missing.gif'},
+        ]))
+        self.assertEqual(Post.objects.get(pk=results[0]['id']).image, name)
+        for result in results[1:]:
+            self.assertIn('image', result['errors'])
+
+    def test_import_posts_command(self):
+        """Команда import_posts читает NDJSON и пишет результаты"""
+        folder = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+        path = f'{folder}/posts.ndjson'
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write('{"text": "Из файла"}\n\n{битая строка\n')
+        results_path = f'{folder}/results.ndjson'
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_posts', path, '--author', 'auth',
+            '--results', results_path, stdout=out, stderr=err,
+        )
+        self.assertIn('Создано постов: 1, отклонено: 1', out.getvalue())
+        self.assertIn('Строка 3', err.getvalue())
+        with open(results_path, encoding='utf-8') as results:
+            lines = [json.loads(line) for line in results]
+        self.assertEqual(Post.objects.get(pk=lines[0]['id']).text, 'Из файла')
+        self.assertIn('errors', lines[1])
@@ -8,20 +8,42 @@ User = get_user_model()
 
 
 class Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
     def test_cache(self):
         """Проверка работы cache"""
-        user = User.objects.create_user(username='auth')
-        author_client = Client()
-        author_client.force_login(user)
-        cache.clear()
         post = Post.objects.create(
-            author=user,
+            author=self.user,
             text='Тестовый текст',
         )
-        author_client.get(reverse('posts:index')).content
-        post.delete()
-        response2 = author_client.get(reverse('posts:index')).content
+        self.author_client.get(reverse('posts:index')).content
+        Post.objects.filter(pk=post.pk).update(text='Изменён без сигналов')
+        response2 = self.author_client.get(reverse('posts:index')).content
         self.assertIn(post.text, response2.decode())
         cache.clear()
-        response3 = author_client.get(reverse('posts:index')).content
+        response3 = self.author_client.get(reverse('posts:index')).content
         self.assertNotIn(post.text, response3.decode())
+
+    def test_cache_invalidated_on_write(self):
+        """Новый и удалённый пост сразу видны на главной"""
+        self.author_client.get(reverse('posts:index'))
+        post = Post.objects.create(
+            author=self.user,
+            text='Свежий пост',
+        )
+        response = self.author_client.get(reverse('posts:index')).content
+        self.assertIn(post.text, response.decode())
+        post.delete()
+        response = self.author_client.get(reverse('posts:index')).content
+        self.assertNotIn(post.text, response.decode())
+
+    def test_follow_page_not_shared_with_index(self):
+        """Лента подписок не берётся из кэша главной"""
+        Post.objects.create(author=self.user, text='Пост на главной')
+        self.author_client.get(reverse('posts:index'))
+        response = self.author_client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, 'Пост на главной')
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_ON_PAGE=3)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый текст')
+        for i in range(7):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{i}'),
+                text=f'Комментарий {i}',
+            )
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+        cls.fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk}
+        )
+
+    def test_post_detail_shows_first_page(self):
+        """Под постом только первая страница комментариев"""
+        response = Client().get(self.detail_url)
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, f'?after={comments.next_cursor}')
+        self.assertNotContains(response, 'Комментарий 3')
+
+    def test_html_fragment(self):
+        """Фрагмент отдаёт следующие комментарии без обёртки страницы"""
+        cursor = Client().get(self.detail_url).context['comments'].next_cursor
+        response = Client().get(self.fragment_url, {'after': cursor})
+        self.assertContains(response, 'Комментарий 3')
+        self.assertNotContains(response, 'Комментарий 2')
+        self.assertNotContains(response, '<html')
+
+    def test_json_pages(self):
+        """JSON-страницы по ссылке next проходят все комментарии"""
+        url = self.fragment_url + '?format=json'
+        texts = []
+        while url:
+            data = Client().get(url).json()
+            texts += [comment['text'] for comment in data['comments']]
+            url = data['next']
+        self.assertEqual(texts, [f'Комментарий {i}' for i in range(7)])
+
+    def test_add_comment_redirects_to_its_page(self):
+        """После отправки открывается страница с новым комментарием"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Новый комментарий'},
+        )
+        comment = Comment.objects.get(text='Новый комментарий')
+        url = response['Location']
+        self.assertTrue(url.endswith(f'#comment-{comment.pk}'))
+        page = client.get(url.split('#')[0])
+        self.assertEqual(
+            [comment.text for comment in page.context['comments']],
+            ['Комментарий 6', 'Новый комментарий'],
+        )
+        self.assertContains(page, f'id="comment-{comment.pk}"')
+
+    def test_queries_do_not_grow_with_comments(self):
+        """Число запросов не зависит от числа комментариев"""
+        client = Client()
+        # Первый запрос кэширует версию страницы для условного GET
+        client.get(self.detail_url)
+        with CaptureQueriesContext(connection) as queries:
+            client.get(self.detail_url)
+        count = len(queries)
+        for i in range(5):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(username=f'extra{i}'),
+                text=f'Ещё комментарий {i}',
+            )
+        client.get(self.detail_url)
+        with self.assertNumQueries(count):
+            client.get(self.detail_url)
+        with self.assertNumQueries(2):
+            client.get(self.fragment_url + '?format=json')
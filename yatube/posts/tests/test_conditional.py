@@ -0,0 +1,140 @@
+import datetime as dt
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый текст',
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'testovyij-slag'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_without_queries(self):
+        """Повторный запрос с ETag - 304 без запросов к базе"""
+        client = Client()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    response = client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        """If-Modified-Since с датой ответа тоже даёт 304"""
+        client = Client()
+        response = client.get(self.urls[0])
+        response = client.get(
+            self.urls[0],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_authorized_hit_skips_feed(self):
+        """Для авторизованного 304 не читает ленту и посты"""
+        client = Client()
+        client.force_login(ConditionalGetTest.user)
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                for query in queries.captured_queries:
+                    self.assertNotIn('posts_', query['sql'])
+
+    def test_etag_depends_on_viewer(self):
+        """Гость и авторизованный получают разные ETag"""
+        client = Client()
+        anonymous = client.get(self.urls[0])['ETag']
+        client.force_login(ConditionalGetTest.user)
+        self.assertNotEqual(client.get(self.urls[0])['ETag'], anonymous)
+
+    def test_changes_give_new_version(self):
+        """Новый пост и новый комментарий меняют ETag страниц"""
+        client = Client()
+        etags = [client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(
+            author=ConditionalGetTest.user,
+            text='Новый',
+            group=ConditionalGetTest.group,
+        )
+        Comment.objects.create(
+            post=ConditionalGetTest.post,
+            author=ConditionalGetTest.user,
+            text='Комментарий',
+        )
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_other_pages_keep_etag(self):
+        """Пост в другой группе не меняет ETag страниц группы и автора"""
+        client = Client()
+        urls = self.urls[1:]
+        etags = [client.get(url)['ETag'] for url in urls]
+        other = Group.objects.create(title='Другая', slug='drugaya')
+        Post.objects.create(
+            author=User.objects.create_user(username='other'),
+            text='Чужой пост',
+            group=other,
+        )
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_edit_and_delete_give_new_version(self):
+        """Правка поста и удаление старого поста меняют ETag"""
+        client = Client()
+        old = Post.objects.create(
+            author=ConditionalGetTest.user, text='Старый', group=self.group
+        )
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=self.post.pub_date - dt.timedelta(days=1)
+        )
+        etags = [client.get(url)['ETag'] for url in self.urls]
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        etags = [client.get(url)['ETag'] for url in self.urls[:3]]
+        old.delete()
+        for url, etag in zip(self.urls[:3], etags):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
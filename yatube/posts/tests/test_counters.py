@@ -0,0 +1,124 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from users.models import Profile
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.user)
+        cls.reader = User.objects.create_user(username='reader')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='testovyij-slag-2',
+            description='Тестовое описание 2',
+        )
+
+    def profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счётчики"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Тестовый текст', 'group': CountersTest.group.pk},
+        )
+        post = Post.objects.get()
+        self.assertEqual(self.profile(CountersTest.user).posts_count, 1)
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(CountersTest.group.posts_count, 1)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Тестовый текст', 'group': CountersTest.group_2.pk},
+        )
+        CountersTest.group.refresh_from_db()
+        CountersTest.group_2.refresh_from_db()
+        self.assertEqual(CountersTest.group.posts_count, 0)
+        self.assertEqual(CountersTest.group_2.posts_count, 1)
+        Post.objects.get(pk=post.pk).delete()
+        CountersTest.group_2.refresh_from_db()
+        self.assertEqual(CountersTest.group_2.posts_count, 0)
+        self.assertEqual(self.profile(CountersTest.user).posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарий увеличивает счётчик поста"""
+        post = Post.objects.create(author=CountersTest.user, text='Текст')
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей"""
+        url = reverse('posts:profile_follow', kwargs={'username': 'auth'})
+        self.reader_client.get(url)
+        self.reader_client.get(url)
+        self.assertEqual(self.profile(CountersTest.user).followers_count, 1)
+        self.assertEqual(
+            self.profile(CountersTest.reader).following_count, 1
+        )
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'auth'})
+        )
+        self.assertEqual(self.profile(CountersTest.user).followers_count, 0)
+        self.assertEqual(
+            self.profile(CountersTest.reader).following_count, 0
+        )
+
+    def test_missing_profile(self):
+        """Пользователь без профиля получает его с настоящими счётчиками"""
+        Post.objects.create(author=CountersTest.reader, text='Пост')
+        Profile.objects.filter(user=CountersTest.reader).delete()
+        reader = User.objects.get(pk=CountersTest.reader.pk)
+        response = self.author_client.get(
+            reverse('posts:profile', kwargs={'username': 'reader'})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['count_post'], 1)
+        self.assertEqual(self.profile(reader).posts_count, 1)
+        Profile.objects.filter(user=reader).delete()
+        response = self.author_client.get(
+            reverse('api:profile', kwargs={'username': 'reader'})
+        )
+        self.assertEqual(response.json()['posts_count'], 1)
+
+    def test_repair_counters_command(self):
+        """Команда repair_counters исправляет расхождения"""
+        Post.objects.create(
+            author=CountersTest.user,
+            text='Текст',
+            group=CountersTest.group,
+        )
+        Profile.objects.filter(user=CountersTest.user).update(posts_count=7)
+        Profile.objects.filter(user=CountersTest.reader).delete()
+        Group.objects.update(posts_count=3)
+        out = StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertIn('users.Profile.posts_count: 1', out.getvalue())
+        self.assertEqual(self.profile(CountersTest.user).posts_count, 1)
+        self.assertEqual(self.profile(CountersTest.reader).posts_count, 0)
+        CountersTest.group.refresh_from_db()
+        CountersTest.group_2.refresh_from_db()
+        self.assertEqual(CountersTest.group.posts_count, 1)
+        self.assertEqual(CountersTest.group_2.posts_count, 0)
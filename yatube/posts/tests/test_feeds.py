@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(FEED_ITEMS=3)
+class FeedsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        for i in range(5):
+            Post.objects.create(
+                author=cls.user, text=f'Пост группы {i}', group=cls.group
+            )
+        Post.objects.create(author=cls.other, text='Пост без группы')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feed_items(self):
+        """Ленты содержат последние посты своей выборки"""
+        response = self.client.get(reverse('posts:index_rss'))
+        self.assertEqual(
+            response['Content-Type'], 'application/rss+xml; charset=utf-8'
+        )
+        self.assertContains(response, '<item>', count=3)
+        self.assertContains(response, 'Пост без группы')
+        response = self.client.get(
+            reverse('posts:group_atom', kwargs={'slug': 'testovyij-slag'})
+        )
+        self.assertContains(response, '<entry>', count=3)
+        self.assertContains(response, 'Тестовое описание')
+        self.assertNotContains(response, 'Пост без группы')
+        response = self.client.get(
+            reverse('posts:author_rss', kwargs={'username': 'other'})
+        )
+        self.assertContains(response, '<item>', count=1)
+        response = self.client.get(
+            reverse('posts:group_rss', kwargs={'slug': 'net-takoj'})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_until_post_changes(self):
+        """Повтор отдаётся из кэша, новый пост сразу попадает в ленту"""
+        url = reverse('posts:author_atom', kwargs={'username': 'auth'})
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, response.content)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertTrue(response.has_header('Last-Modified'))
+        Post.objects.create(author=FeedsTest.user, text='Свежий пост')
+        self.assertContains(self.client.get(url), 'Свежий пост')
+
+    def test_page_links_feeds(self):
+        """Страница группы ссылается на свои ленты"""
+        response = self.client.get(
+            reverse('posts:group_posts', kwargs={'slug': 'testovyij-slag'})
+        )
+        self.assertContains(
+            response,
+            reverse('posts:group_rss', kwargs={'slug': 'testovyij-slag'}),
+        )
@@ -116,6 +116,7 @@ class CreateCommentTest(TestCase):
             data=comment_text,
             follow=True
         )
+        comment = post.comments.latest('pk')
         self.assertRedirects(response, reverse('posts:post_detail', kwargs={
-            'post_id': '1'}))
+            'post_id': '1'}) + f'#comment-{comment.pk}')
         self.assertEqual(post.comments.count(), comment_count + 1)
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..paginators import KeysetPaginator, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        for i in range(1, 13):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Тестовый текст {i} поста',
+                group=cls.group,
+            )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_roundtrip(self):
+        """Курсор кодируется и декодируется без потерь"""
+        token = encode_cursor(['2021-12-03T03:50:00+00:00', 7])
+        self.assertEqual(
+            decode_cursor(token), ['2021-12-03T03:50:00+00:00', 7]
+        )
+        self.assertIsNone(decode_cursor('не-курсор'))
+
+    def test_walk_forward_and_back(self):
+        """Проход вперёд и назад по курсорам возвращает все записи"""
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        first = paginator.get_page()
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+        second = paginator.get_page(after=first.next_cursor)
+        third = paginator.get_page(after=second.next_cursor)
+        self.assertFalse(third.has_next())
+        walked = list(first) + list(second) + list(third)
+        self.assertEqual(walked, KeysetPaginatorTest.posts)
+        back = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_gives_first_page(self):
+        """Испорченный курсор ведёт на первую страницу"""
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        page = paginator.get_page(after='испорчен')
+        self.assertEqual(list(page), KeysetPaginatorTest.posts[:5])
+
+    @override_settings(PAGINATION_MODES={'index': 'keyset'})
+    def test_index_keyset_mode(self):
+        """Главная в режиме keyset отдаёт страницы по ?after="""
+        client = Client()
+        response = client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_keyset)
+        self.assertContains(response, f'?after={page_obj.next_cursor}')
+        response = client.get(
+            reverse('posts:index') + f'?after={page_obj.next_cursor}'
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(PAGINATION_MODES={'group_posts': 'keyset'})
+    def test_group_keyset_without_count(self):
+        """Лента группы в режиме keyset не выполняет COUNT"""
+        url = reverse('posts:group_posts', kwargs={'slug': 'testovyij-slag'})
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(url)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
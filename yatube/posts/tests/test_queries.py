@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        for i in range(12):
+            author = User.objects.create_user(
+                username=f'author{i}',
+                first_name='Имя',
+                last_name=f'Фамилия {i}',
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author,
+                text=f'Тестовый текст {i} поста',
+                group=cls.group,
+            )
+        cls.last_post = post
+        for i in range(10):
+            Post.objects.create(
+                author=User.objects.get(username='author0'),
+                text=f'Ещё один пост {i}',
+            )
+        for i in range(5):
+            Comment.objects.create(
+                post=post,
+                author=User.objects.create_user(username=f'commenter{i}'),
+                text=f'Комментарий {i}',
+            )
+
+    def count_queries(self, url, page_size):
+        cache.clear()
+        with override_settings(POSTS_ON_PAGE=page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.reader_client.get(url)
+        self.assertEqual(len(response.context['page_obj']), page_size)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        """Число запросов ленты не зависит от размера страницы"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'testovyij-slag'}),
+            reverse('posts:profile', kwargs={'username': 'author0'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.count_queries(url, 1),
+                    self.count_queries(url, 10),
+                )
+
+    def test_post_detail_comment_authors_in_one_query(self):
+        """Авторы комментариев загружаются вместе с комментариями"""
+        url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': FeedQueriesTest.last_post.pk}
+        )
+        self.reader_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(url)
+        count = len(queries)
+        Comment.objects.filter(post=FeedQueriesTest.last_post)[0].delete()
+        # Удаление меняет версию страницы, она кэшируется заново
+        self.reader_client.get(url)
+        with self.assertNumQueries(count):
+            self.reader_client.get(url)
+
+    def test_for_feed_comment_count(self):
+        """for_feed() загружает число комментариев без лишних запросов"""
+        post = Post.objects.for_feed().get(pk=FeedQueriesTest.last_post.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(post.comments_count, 5)
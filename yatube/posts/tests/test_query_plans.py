@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def bad_steps(sql, allow_sort=False):
+    """Шаги плана, на которых SQLite читает таблицу целиком
+    или сортирует результат во временном B-дереве."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        steps = [row[-1] for row in cursor.fetchall()]
+    return [
+        step for step in steps
+        if (step.startswith('USE TEMP B-TREE') and not allow_sort)
+        or (step.startswith('SCAN ') and 'INDEX' not in step)
+    ]
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.client_user = Client()
+        cls.client_user.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(3):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый текст {i}',
+                group=cls.group,
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_plans_use_indexes(self, url, allow_sort=False):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_user.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(bad_steps(sql, allow_sort), [])
+
+    def test_feed_plans(self):
+        """Запросы лент и страниц читают данные по индексам"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'testovyij-slag'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            self.assert_plans_use_indexes(url)
+
+    @override_settings(PAGINATION_DEFAULT='keyset', PAGINATION_MODES={})
+    def test_keyset_feed_plans(self):
+        """Страницы по курсору тоже читаются по индексам"""
+        for name, kwargs in (
+            ('posts:index', {}),
+            ('posts:group_posts', {'slug': 'testovyij-slag'}),
+            ('posts:profile', {'username': 'author'}),
+        ):
+            url = reverse(name, kwargs=kwargs)
+            page_obj = self.client_user.get(url).context['page_obj']
+            cursor = page_obj.paginator.cursor_for(page_obj[0])
+            self.assert_plans_use_indexes(f'{url}?after={cursor}')
+
+    def test_follow_plans(self):
+        """Лента подписок читается по индексам авторов.
+
+        Посты нескольких авторов сливаются сортировкой, но сортируются
+        только посты из подписок, а не вся таблица."""
+        self.assert_plans_use_indexes(
+            reverse('posts:follow_index'), allow_sort=True
+        )
+
+    @override_settings(TIMELINE_ENABLED=True)
+    def test_timeline_plans(self):
+        """Материализованная лента подписок читается по индексам"""
+        Follow.objects.filter(user=self.user).delete()
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assert_plans_use_indexes(
+            reverse('posts:follow_index'), allow_sort=True
+        )
@@ -0,0 +1,110 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Рецепт борща с <b>пампушками</b>',
+        )
+        cls.other = Post.objects.create(
+            author=cls.user,
+            text='Заметки о путешествии',
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.other,
+            author=cls.user,
+            text='А где рецепт борща?',
+        )
+
+    def search(self, query, **params):
+        return Client().get(
+            reverse('posts:post_search'), {'q': query, **params}
+        )
+
+    def count(self, query):
+        return len(self.search(query).context['page_obj'])
+
+    def test_ranked_results_with_snippets(self):
+        """Поиск находит посты и комментарии и подсвечивает совпадения"""
+        response = self.search('борщ')
+        hits = list(response.context['page_obj'])
+        self.assertEqual(
+            {(hit.kind, hit.post_id) for hit in hits},
+            {('post', SearchTest.post.pk), ('comment', SearchTest.other.pk)},
+        )
+        self.assertEqual(hits[0].post, Post.objects.get(pk=hits[0].post_id))
+        self.assertContains(response, '<mark>борща</mark>')
+        self.assertContains(response, '&lt;b&gt;пампушками&lt;/b&gt;')
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении"""
+        post = Post.objects.get(pk=SearchTest.other.pk)
+        post.text = 'Заметки о велосипедах'
+        post.save()
+        self.assertEqual(self.count('велосипед'), 1)
+        self.assertEqual(self.count('путешествии'), 0)
+        Comment.objects.get(pk=SearchTest.comment.pk).delete()
+        self.assertEqual(self.count('борща'), 1)
+
+    @override_settings(POSTS_ON_PAGE=2)
+    def test_keyset_pages(self):
+        """Результаты листаются курсором без повторов"""
+        for i in range(3):
+            Post.objects.create(author=SearchTest.user, text=f'Борщ {i}')
+        first = self.search('борщ').context['page_obj']
+        self.assertTrue(first.has_next())
+        second = self.search('борщ', after=first.next_cursor).context[
+            'page_obj'
+        ]
+        third = self.search('борщ', after=second.next_cursor).context[
+            'page_obj'
+        ]
+        rowids = [hit.rowid for hit in (*first, *second, *third)]
+        self.assertEqual(len(rowids), 5)
+        self.assertEqual(len(set(rowids)), 5)
+        self.assertFalse(third.has_next())
+        back = self.search('борщ', before=second.previous_cursor).context[
+            'page_obj'
+        ]
+        self.assertEqual(
+            [hit.rowid for hit in back], [hit.rowid for hit in first]
+        )
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index восстанавливает индекс"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.count('борща'), 0)
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Проиндексировано: 3', out.getvalue())
+        self.assertEqual(self.count('борща'), 2)
+
+    def test_admin_uses_full_text_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс"""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'борщ'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].queryset), [SearchTest.post]
+        )
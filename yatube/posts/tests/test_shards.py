@@ -0,0 +1,265 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import bulk, checks, search
+from ..counters import repair
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+SHARDS = ['shard_0', 'shard_1']
+
+
+@override_settings(POST_SHARDS=SHARDS, POST_SHARD_SLOTS=4, POSTS_ON_PAGE=3)
+class ShardsTest(TestCase):
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        # Слоты 1 и 2: авторы в разных шардах
+        self.first = User.objects.create_user(username='first', pk=1)
+        self.second = User.objects.create_user(
+            username='second', pk=2, first_name='Второй', last_name='Автор'
+        )
+        self.posts = [
+            Post.objects.create(
+                author=author, text=f'Пост {i}', group=self.group
+            )
+            for i, author in enumerate([self.first, self.second] * 4)
+        ]
+        self.client = Client()
+        self.client.force_login(self.first)
+
+    def test_posts_by_author(self):
+        """Пост лежит в шарде автора, слот виден по id"""
+        for post in self.posts:
+            self.assertEqual(post.pk % 4, post.author_id)
+        self.assertEqual(Post.objects.using('shard_1').count(), 4)
+        self.assertEqual(Post.objects.using('shard_0').count(), 4)
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertEqual(self.first.posts.count(), 4)
+        self.first.profile.refresh_from_db()
+        self.assertEqual(self.first.profile.posts_count, 4)
+
+    def test_scatter_gather_feed(self):
+        """Главная собирает страницы шардов по дате"""
+        texts = []
+        url = reverse('posts:index')
+        params = {}
+        while True:
+            page = self.client.get(url, params).context['page_obj']
+            self.assertEqual(len(texts) == 0, not page.has_previous())
+            texts += [post.text for post in page]
+            if not page.has_next():
+                break
+            params = {'after': page.next_cursor}
+        self.assertEqual(texts, [f'Пост {i}' for i in range(7, -1, -1)])
+        response = self.client.get(
+            reverse('posts:group_posts', kwargs={'slug': 'testovyij-slag'})
+        )
+        self.assertContains(response, 'Второй Автор')
+
+    def test_comment_in_post_shard(self):
+        """Комментарий пишется и читается в шарде своего поста"""
+        post = self.posts[1]
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий из шарда'},
+        )
+        comment = Comment.objects.using('shard_0').get(post=post)
+        self.assertEqual(comment.author, self.first)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'Комментарий из шарда')
+        self.assertEqual(response.context['post'].author, self.second)
+
+    def test_reshard(self):
+        """reshard переносит посты в шард автора и в новые базы"""
+        with override_settings(POST_SHARDS=[]):
+            legacy = Post.objects.create(author=self.second, text='Старый')
+            Comment.objects.create(
+                post=legacy, author=self.first, text='Старый комментарий'
+            )
+        with override_settings(POST_SHARDS=['shard_0']):
+            call_command('reshard', 'default', *SHARDS, stdout=StringIO())
+            self.assertEqual(Post.objects.using('shard_0').count(), 9)
+        self.assertFalse(Post.objects.using('default').exists())
+        call_command('reshard', stdout=StringIO())
+        self.assertEqual(Post.objects.using('shard_1').count(), 4)
+        moved = Post.objects.using('shard_0').get(text='Старый')
+        self.assertNotEqual(moved.pk, legacy.pk)
+        self.assertEqual(moved.pk % 4, 2)
+        self.assertContains(
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': moved.pk})
+            ),
+            'Старый комментарий',
+        )
+        # Старый адрес ведёт на новый
+        self.assertRedirects(
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': legacy.pk})
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': moved.pk}),
+            status_code=301,
+        )
+        self.assertEqual(self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': legacy.pk}),
+            {'format': 'json'},
+        ).status_code, 301)
+
+    def test_delete_reaches_shards(self):
+        """Удаление пользователя и группы доходит до шардов"""
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.second, text='Чужой')
+        self.second.delete()
+        self.assertFalse(Post.objects.using('shard_0').exists())
+        self.assertFalse(Comment.objects.using('shard_1').exists())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 4)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Второй Автор')
+        self.group.delete()
+        self.assertFalse(
+            Post.objects.using('shard_1').exclude(group=None).exists()
+        )
+        self.assertEqual(
+            self.client.get(reverse('posts:index')).status_code, 200
+        )
+
+    def test_feeds_gather_shards(self):
+        """RSS и Atom собирают последние посты всех шардов"""
+        response = self.client.get(reverse('posts:index_atom'))
+        content = response.content.decode()
+        positions = [content.index(f'Пост {i}') for i in range(7, -1, -1)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn('Второй Автор', content)
+        response = self.client.get(
+            reverse('posts:group_rss', kwargs={'slug': 'testovyij-slag'})
+        )
+        self.assertContains(response, 'Пост 0')
+        self.assertContains(response, 'Пост 7')
+
+    def test_api_gathers_shards(self):
+        """API листает посты всех шардов и читает пост из его шарда"""
+        url = reverse('api:posts') + '?limit=3'
+        texts = []
+        while url:
+            data = self.client.get(url).json()
+            texts += [post['text'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(texts, [f'Пост {i}' for i in range(7, -1, -1)])
+        post = self.posts[1]
+        Comment.objects.create(post=post, author=self.first, text='Из шарда')
+        data = self.client.get(
+            reverse('api:post', kwargs={'post_id': post.pk})
+        ).json()
+        self.assertEqual(data['author'], 'second')
+        self.assertEqual(data['comments_count'], 1)
+        data = self.client.get(
+            reverse('api:post_comments', kwargs={'post_id': post.pk})
+        ).json()
+        self.assertEqual(
+            [(c['author'], c['text']) for c in data['results']],
+            [('first', 'Из шарда')],
+        )
+
+    def test_versions_see_shard_writes(self):
+        """Новый пост в шарде меняет версию ленты и ETag"""
+        url = reverse('api:posts')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        Post.objects.create(author=self.second, text='Новый')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый')
+
+    def test_search_refused(self):
+        """Поиск выключен: индекс в основной базе не знает о шардах"""
+        self.assertFalse(search.available())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {search.TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        response = self.client.get(reverse('posts:post_search'), {'q': 'Пост'})
+        self.assertEqual(response.status_code, 404)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', stdout=StringIO())
+
+    def test_export_refused(self):
+        """Посты и комментарии из шардов не выгружаются, подписки - да"""
+        self.first.is_staff = True
+        self.first.save()
+        for table, status in (('posts', 404), ('comments', 404),
+                              ('follows', 200)):
+            response = self.client.get(
+                reverse('posts:export_table', kwargs={'table': table})
+            )
+            self.assertEqual(response.status_code, status)
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'posts', stdout=StringIO())
+
+    def test_repair_counters(self):
+        """repair считает посты и комментарии по шардам"""
+        Comment.objects.create(
+            post=self.posts[0], author=self.second, text='Комментарий'
+        )
+        self.assertEqual(sum(repair(dry_run=True).values()), 0)
+        Group.objects.update(posts_count=0)
+        Post.objects.using('shard_1').update(comments_count=5)
+        report = repair()
+        self.assertEqual(report['posts.Group.posts_count'], 1)
+        self.assertEqual(report['posts.Post.comments_count'], 4)
+        self.assertEqual(Group.objects.get().posts_count, 8)
+        self.assertEqual(
+            Post.objects.using('shard_1').get(pk=self.posts[0].pk)
+            .comments_count, 1,
+        )
+
+    def test_sitemap_gathers_shards(self):
+        """Страница карты постов собирает диапазон из всех шардов"""
+        response = self.client.get(
+            reverse('posts:sitemap_section', kwargs={'section': 'posts'})
+        )
+        for post in self.posts:
+            self.assertContains(
+                response,
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            )
+        response = self.client.get(
+            reverse('posts:sitemap_section', kwargs={'section': 'groups'})
+        )
+        self.assertContains(response, 'testovyij-slag')
+
+    def test_bulk_create_in_author_shard(self):
+        """Пакетное создание кладёт посты в шард автора"""
+        results = list(bulk.create(self.second, [
+            {'text': 'Пакетный', 'group': 'testovyij-slag'},
+        ]))
+        post = Post.objects.using('shard_0').get(pk=results[0]['id'])
+        self.assertEqual(post.pk % 4, 2)
+        self.assertEqual(post.group_id, self.group.pk)
+
+    def test_timeline_check(self):
+        """Материализованные ленты с шардами - ошибка настройки"""
+        self.assertEqual(checks.sharded_features(None), [])
+        with override_settings(TIMELINE_ENABLED=True):
+            errors = checks.sharded_features(None)
+        self.assertEqual([error.id for error in errors], ['posts.E001'])
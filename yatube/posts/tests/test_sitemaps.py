@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(SITEMAP_CHUNK_SIZE=3)
+class SitemapTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testovyij-slag',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group
+            )
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def section(self, name, page=1):
+        return self.client.get(
+            reverse('posts:sitemap_section', kwargs={'section': name}),
+            {'p': page},
+        )
+
+    def test_index_lists_pages(self):
+        """Индекс ссылается на все страницы разделов"""
+        response = self.client.get(reverse('posts:sitemap'))
+        self.assertContains(response, 'sitemap-posts.xml?p=3')
+        self.assertNotContains(response, 'sitemap-posts.xml?p=4')
+        self.assertContains(response, 'sitemap-groups.xml')
+        self.assertContains(response, 'sitemap-profiles.xml')
+
+    def test_pages_by_id_range(self):
+        """Страница - диапазон id, lastmod - дата поста"""
+        response = self.section('posts', 2)
+        for post in self.posts[3:6]:
+            self.assertContains(response, f'/posts/{post.pk}/')
+        self.assertNotContains(response, f'/posts/{self.posts[2].pk}/<')
+        self.assertContains(response, '<lastmod>')
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertContains(self.section('groups'), '/group/testovyij-slag/')
+        self.assertContains(self.section('profiles'), '/profile/auth/')
+        self.assertEqual(self.section('posts', 4).status_code, 404)
+        self.assertEqual(self.section('posts', 'x').status_code, 404)
+        self.assertEqual(self.section('comments').status_code, 404)
+
+    def test_cached_per_chunk(self):
+        """Страница берётся из кэша, пока не меняется её диапазон"""
+        first = self.section('posts', 1).content
+        with self.assertNumQueries(0):
+            self.assertEqual(self.section('posts', 1).content, first)
+        Post.objects.create(author=self.user, text='Новый')
+        self.posts[6].save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.section('posts', 1).content, first)
+        Post.objects.filter(pk=self.posts[0].pk).delete()
+        self.assertNotEqual(self.section('posts', 1).content, first)
+
+    def test_render_sitemaps_command(self):
+        """Команда render_sitemaps пишет индекс и страницы в файлы"""
+        folder = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        call_command(
+            'render_sitemaps', folder, '--domain', 'yatube.test',
+            stdout=StringIO(),
+        )
+        with open(os.path.join(folder, 'sitemap.xml')) as index:
+            content = index.read()
+        self.assertIn('https://yatube.test/sitemap-posts-3.xml', content)
+        with open(os.path.join(folder, 'sitemap-posts-3.xml')) as page:
+            self.assertIn(
+                f'https://yatube.test/posts/{self.posts[6].pk}/', page.read()
+            )
@@ -0,0 +1,183 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+from .. import thumbnails
+from ..thumbnails import feed_thumbnail
+from ..variants import supported_formats, target_widths
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_THUMBNAIL_ASYNC=True)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=ThumbnailPipelineTest.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    def test_original_until_thumbnail_ready(self):
+        """Пока миниатюры нет, лента показывает исходную картинку"""
+        self.assertIsNone(feed_thumbnail(self.post.image))
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+
+    def test_warm_thumbnails_command(self):
+        """Команда warm_thumbnails готовит миниатюры и копии заранее"""
+        call_command(
+            'warm_thumbnails', '--workers', '1', verbosity=0, stdout=StringIO()
+        )
+        self.assertIsNotNone(feed_thumbnail(self.post.image))
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.variants)
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_rollback_does_not_hold_key(self):
+        """Задача из откатившейся транзакции не блокирует повтор"""
+        key = ('thumbnail', self.post.image.name)
+        thumbnails.submit(key, thumbnails.generate, self.post.image.name)
+        # В TestCase транзакция не фиксируется, как при откате
+        self.assertNotIn(key, thumbnails._pending)
+
+    def test_post_create_accepts_image(self):
+        """Картинка из формы создания поста сохраняется"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile(
+                    name='new.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif',
+                ),
+            },
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.assertTrue(post.image.name.startswith('posts/new'))
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_THUMBNAIL_ASYNC=False,
+    POST_IMAGE_WIDTHS=(480, 960, 1440),
+)
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_image_file(self, size=(1000, 500)):
+        buffer = BytesIO()
+        Image.new('RGB', size=size, color=(255, 0, 0)).save(buffer, 'png')
+        return SimpleUploadedFile(
+            name='big.png',
+            content=buffer.getvalue(),
+            content_type='image/png',
+        )
+
+    def test_variants_built_on_upload(self):
+        """При загрузке строятся копии нужных ширин без увеличения"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Большая картинка', 'image': self.get_image_file()},
+        )
+        post = Post.objects.get(text='Большая картинка')
+        widths = sorted({v['width'] for v in post.variants})
+        self.assertEqual(widths, [480, 960, 1000])
+        self.assertEqual(
+            {v['format'] for v in post.variants}, set(supported_formats())
+        )
+        smallest = next(v for v in post.variants if v['format'] == 'jpeg')
+        self.assertEqual((smallest['width'], smallest['height']), (480, 240))
+        self.assertTrue(smallest['name'].startswith('posts/variants/big'))
+        self.assertTrue(smallest['name'].endswith('-480w.jpg'))
+
+    def test_wide_original(self):
+        """Картинка шире всех ширин даёт по копии каждой ширины"""
+        self.assertEqual(target_widths(2000), [480, 960, 1440])
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Широкая картинка',
+                'image': self.get_image_file(size=(2000, 500)),
+            },
+        )
+        post = Post.objects.get(text='Широкая картинка')
+        jpegs = [v['width'] for v in post.variants if v['format'] == 'jpeg']
+        self.assertEqual(jpegs, [480, 960, 1440])
+
+    def test_edit_removes_old_variants(self):
+        """Смена картинки удаляет файлы копий прежней"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Большая картинка', 'image': self.get_image_file()},
+        )
+        post = Post.objects.get(text='Большая картинка')
+        old_names = [v['name'] for v in post.variants]
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Новая картинка', 'image': self.get_image_file()},
+        )
+        post.refresh_from_db()
+        self.assertTrue(post.variants)
+        for name in old_names:
+            self.assertFalse(default_storage.exists(name))
+        for variant in post.variants:
+            self.assertTrue(default_storage.exists(variant['name']))
+
+    def test_picture_markup(self):
+        """Лента выводит <picture> с srcset, размерами и lazy-загрузкой"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Большая картинка', 'image': self.get_image_file()},
+        )
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, '-480w.jpg 480w')
+        self.assertContains(response, 'width="1000" height="500"')
+        self.assertContains(response, 'loading="lazy"')
@@ -0,0 +1,152 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models import Profile
+
+from ..models import Follow, Post, TimelineEntry
+from ..timeline import follow_posts
+
+User = get_user_model()
+
+
+@override_settings(TIMELINE_ENABLED=True, TIMELINE_FANOUT_LIMIT=1)
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.other = User.objects.create_user(username='other')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_backfill_on_follow(self):
+        """Подписка переносит в ленту уже опубликованные посты"""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=TimelineTest.reader, post=TimelineTest.old_post
+        ).exists())
+
+    def test_fan_out_and_prune(self):
+        """Новый пост попадает в ленту, отписка убирает его"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author
+        )
+        post = Post.objects.create(
+            author=TimelineTest.author,
+            text='Пост после подписки',
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=TimelineTest.reader).exists()
+        )
+
+    def test_popular_author_read_on_demand(self):
+        """Посты популярного автора подмешиваются при чтении"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.star
+        )
+        Follow.objects.create(
+            user=TimelineTest.other, author=TimelineTest.star
+        )
+        post = Post.objects.create(
+            author=TimelineTest.star,
+            text='Пост популярного автора',
+        )
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertIn(post, follow_posts(TimelineTest.reader))
+        self.assertIn(post, follow_posts(TimelineTest.other))
+
+    def test_popular_posts_survive_unfollow(self):
+        """Посты, написанные в популярности, остаются в ленте, когда
+        автор опускается ниже порога"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.star
+        )
+        Follow.objects.create(
+            user=TimelineTest.other, author=TimelineTest.star
+        )
+        post = Post.objects.create(
+            author=TimelineTest.star,
+            text='Пост популярного автора',
+        )
+        self.assertIn(post, follow_posts(TimelineTest.reader))
+        Follow.objects.filter(user=TimelineTest.other).delete()
+        self.assertIn(post, follow_posts(TimelineTest.reader))
+        self.assertNotIn(post, follow_posts(TimelineTest.other))
+
+    def test_popularity_from_one_source(self):
+        """Запись и чтение решают о популярности по одному счётчику"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.star
+        )
+        # Счётчик уже перешёл порог, а подписка в таблице одна
+        Profile.objects.filter(user=TimelineTest.star).update(
+            followers_count=2
+        )
+        post = Post.objects.create(
+            author=TimelineTest.star,
+            text='Пост на пороге',
+        )
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertIn(post, follow_posts(TimelineTest.reader))
+        Profile.objects.filter(user=TimelineTest.star).update(
+            followers_count=1
+        )
+        post = Post.objects.create(
+            author=TimelineTest.star,
+            text='Пост ниже порога',
+        )
+        self.assertIn(post, follow_posts(TimelineTest.reader))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=10)
+    def test_fan_out_queries_do_not_grow(self):
+        """Раскладка и обрезка лент не зависят от числа подписчиков"""
+        def fan_out_queries():
+            with CaptureQueriesContext(connection) as queries:
+                Post.objects.create(author=TimelineTest.author, text='Пост')
+            return len(queries)
+
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author
+        )
+        single = fan_out_queries()
+        for i in range(3):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'reader{i}'),
+                author=TimelineTest.author,
+            )
+        self.assertEqual(fan_out_queries(), single)
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_capped(self):
+        """Лента обрезается до TIMELINE_LENGTH записей"""
+        Follow.objects.create(
+            user=TimelineTest.reader, author=TimelineTest.author
+        )
+        for i in range(3):
+            Post.objects.create(
+                author=TimelineTest.author,
+                text=f'Пост {i}',
+            )
+        entries = TimelineEntry.objects.filter(user=TimelineTest.reader)
+        self.assertEqual(entries.count(), 2)
+        self.assertNotIn(
+            TimelineTest.old_post.pk, entries.values_list('post', flat=True)
+        )
@@ -0,0 +1,145 @@
+"""Фоновая обработка картинок постов: миниатюры и адаптивные копии.
+
+Запрос, которому не хватило готовой миниатюры, не ждёт её генерации:
+он отдаёт исходную картинку и ставит задачу в локальный пул потоков.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import timing
+
+from . import variants
+from .cache import bump_generation
+
+logger = logging.getLogger(__name__)
+
+FEED_GEOMETRY = '960x339'
+FEED_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl-thumbnail, умеющий отвечать без генерации."""
+
+    def _resolve_options(self, source, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with timing.measure('thumbnail'):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None, если её ещё не сгенерировали."""
+        with timing.measure('thumbnail'):
+            source = ImageFile(file_)
+            options = self._resolve_options(source, options)
+            name = self._get_thumbnail_filename(
+                source, geometry_string, options
+            )
+            return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def generate(name):
+    """Генерирует миниатюру ленты для файла name."""
+    return default.backend.get_thumbnail(name, FEED_GEOMETRY, **FEED_OPTIONS)
+
+
+def _run_in_background(key, func, *args):
+    try:
+        func(*args)
+        bump_generation()
+    except Exception:
+        logger.exception('Не удалось обработать картинку: %s', key)
+    finally:
+        with _executor_lock:
+            _pending.discard(key)
+        connections.close_all()
+
+
+def submit(key, func, *args):
+    """Выполняет func(*args) в пуле после фиксации транзакции.
+
+    Повторная задача с тем же key, пока первая не выполнена, пропускается.
+    """
+    if not settings.POST_THUMBNAIL_ASYNC:
+        func(*args)
+        return
+    # Ключ занимается только после фиксации: при откате он не зависнет
+    transaction.on_commit(lambda: _schedule(key, func, *args))
+
+
+def _schedule(key, func, *args):
+    with _executor_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    get_executor().submit(_run_in_background, key, func, *args)
+
+
+def enqueue(name):
+    """Ставит генерацию миниатюры ленты в очередь."""
+    submit(('thumbnail', name), generate, name)
+
+
+def process_upload(post):
+    """Готовит в фоне миниатюру и адаптивные копии новой картинки."""
+    enqueue(post.image.name)
+    submit(
+        ('variants', post.pk, post.image.name),
+        variants.build_variants, post.pk, post.image.name,
+    )
+
+
+def discard_variants(post, old_variants):
+    """Удаляет в фоне копии прежней картинки поста."""
+    if old_variants:
+        submit(
+            ('discard', post.pk, old_variants[0]['name']),
+            variants.delete_variants, old_variants,
+        )
+
+
+def feed_thumbnail(image):
+    """Миниатюра для ленты; None, пока она готовится в фоне."""
+    if not image:
+        return None
+    if not settings.POST_THUMBNAIL_ASYNC:
+        return generate(image)
+    thumbnail = default.backend.get_cached_thumbnail(
+        image, FEED_GEOMETRY, **FEED_OPTIONS
+    )
+    if thumbnail is None:
+        enqueue(image.name)
+    return thumbnail
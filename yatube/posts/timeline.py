@@ -0,0 +1,127 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Новый пост раскладывается в ленты подписчиков автора сразу при
+публикации. Посты авторов с огромным числом подписчиков (по
+Profile.followers_count) в ленты не копируются, а помечаются
+fanned_out=False и подмешиваются при чтении (fan-out on read). Метка
+остаётся с постом, поэтому он не пропадает из лент, когда автор
+переходит порог в любую сторону.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from users.models import Profile
+
+from . import shards
+from .models import Follow, Post, TimelineEntry
+
+
+def popular_authors(author_ids):
+    """Авторы, чьи посты не раскладываются по лентам подписчиков."""
+    return Profile.objects.filter(
+        user__in=author_ids,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('user')
+
+
+def _trim(where, params):
+    """Одним запросом оставляет в лентах читателей, выбранных условием
+    where, только TIMELINE_LENGTH последних записей."""
+    table = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            'SELECT id FROM ('
+            'SELECT id, ROW_NUMBER() OVER ('
+            'PARTITION BY user_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {table} WHERE {where}'
+            ') ranked WHERE position > %s)',
+            [*params, settings.TIMELINE_LENGTH],
+        )
+
+
+def trim(user_id):
+    """Оставляет в ленте только TIMELINE_LENGTH последних записей."""
+    _trim('user_id = %s', [user_id])
+
+
+def trim_followers(author_id):
+    """Обрезает ленты всех подписчиков автора одним запросом."""
+    _trim(
+        f'user_id IN (SELECT user_id FROM {Follow._meta.db_table} '
+        'WHERE author_id = %s)',
+        [author_id],
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    fan_out_posts(post.author_id, [post])
+
+
+def fan_out_posts(author_id, posts):
+    """Раскладывает новые посты одного автора по лентам подписчиков."""
+    if popular_authors([author_id]).exists():
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            fanned_out=False
+        )
+        for post in posts:
+            post.fanned_out = False
+        return
+    followers = list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+            for post in posts
+        ],
+        ignore_conflicts=True,
+    )
+    if followers:
+        trim_followers(author_id)
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними постами нового автора из подписок."""
+    if popular_authors([author_id]).exists():
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follow_posts(user):
+    """Посты из подписок пользователя."""
+    authors = Follow.objects.filter(user=user).values('author')
+    if shards.enabled():
+        # Подписки - в основной базе, посты - в шардах
+        return Post.objects.filter(
+            author__in=list(authors.values_list('author', flat=True))
+        )
+    if not settings.TIMELINE_ENABLED:
+        return Post.objects.filter(author__in=authors)
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=authors, fanned_out=False)
+    )
@@ -0,0 +1,110 @@
+"""Адаптивные копии картинок постов для <picture> и srcset."""
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, features
+
+from . import shards
+from .models import Post
+
+MIME_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+
+
+def supported_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет записывать Pillow."""
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format != 'webp' or features.check('webp')
+    ]
+
+
+def target_widths(original_width):
+    """Ширины копий без увеличения исходной картинки."""
+    widths = {w for w in settings.POST_IMAGE_WIDTHS if w < original_width}
+    widths.add(min(original_width, max(settings.POST_IMAGE_WIDTHS)))
+    return sorted(widths)
+
+
+def render_variants(name):
+    """Сохраняет копии картинки name и возвращает их описание."""
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = image.convert('RGB')
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = []
+    for width in target_widths(image.width):
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for image_format in supported_formats():
+            buffer = BytesIO()
+            resized.save(
+                buffer, image_format.upper(),
+                quality=settings.POST_IMAGE_QUALITY,
+            )
+            saved = default_storage.save(
+                f'posts/variants/{stem}-{width}w.{EXTENSIONS[image_format]}',
+                ContentFile(buffer.getvalue()),
+            )
+            variants.append({
+                'width': width,
+                'height': height,
+                'format': image_format,
+                'name': saved,
+            })
+    return variants
+
+
+def build_variants(post_id, name):
+    """Готовит копии и сохраняет их описание, если картинка не сменилась."""
+    variants = render_variants(name)
+    updated = (
+        shards.of_post(Post.objects, post_id)
+        .filter(pk=post_id, image=name)
+        .update(
+            image_variants=json.dumps(variants), edited=timezone.now()
+        )
+    )
+    if not updated:
+        # Картинку успели сменить: копии уже никому не нужны
+        delete_variants(variants)
+
+
+def delete_variants(variants):
+    """Удаляет файлы копий из описания variants."""
+    for variant in variants:
+        default_storage.delete(variant['name'])
+
+
+def picture(post):
+    """Данные для <picture>: источники по форматам и запасной <img>."""
+    variants = post.variants
+    if not variants:
+        return None
+    sources = []
+    for image_format in MIME_TYPES:
+        chosen = [v for v in variants if v['format'] == image_format]
+        if chosen:
+            sources.append({
+                'type': MIME_TYPES[image_format],
+                'srcset': ', '.join(
+                    f"{default_storage.url(v['name'])} {v['width']}w"
+                    for v in chosen
+                ),
+                'variants': chosen,
+            })
+    fallback = sources[0]
+    largest = fallback['variants'][-1]
+    return {
+        'sources': sources[1:],
+        'src': default_storage.url(largest['name']),
+        'srcset': fallback['srcset'],
+        'width': largest['width'],
+        'height': largest['height'],
+    }
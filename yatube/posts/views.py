@@ -1,28 +1,40 @@
-from django.core.paginator import Paginator
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Post, Group, Follow, User
+from django.urls import reverse
+from . import conditional, export, search, shards, thumbnails
+from .cache import generation
+from .counters import profile_of
+from .models import (ArchivedComment, ArchivedPost, Comment, Post, Group,
+                     Follow, User)
 from .forms import PostForm, CommentForm
-from django.conf import settings
+from .paginators import KeysetPaginator, paginate
+from .timeline import follow_posts
 
 
+@conditional.conditional_page('index', conditional.index_version)
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    page_obj = paginate(request, posts, 'index')
     context = {
         'page_obj': page_obj,
+        'cache_generation': generation(),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional.conditional_page('group_posts', conditional.group_version)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.for_feed()
+    page_obj = paginate(request, posts, 'group_posts')
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -30,13 +42,17 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional.conditional_page('profile', conditional.profile_version)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    count_post = posts.count()
-    paginator = Paginator(posts, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    posts = author.posts.for_feed()
+    count_post = profile_of(author).posts_count
+    page_obj = paginate(
+        request, posts, 'profile',
+        archived=author.archived_posts.for_feed(),
+    )
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -52,40 +68,160 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def follow_move(view):
+    """301 с прежнего id поста на новый, выданный при раскладке по
+    шардам."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            new_id = shards.moved_id(kwargs['post_id'])
+            if new_id is None:
+                raise
+        url = reverse(request.resolver_match.view_name, kwargs={
+            **request.resolver_match.kwargs, 'post_id': new_id,
+        })
+        if request.GET:
+            url += '?' + request.GET.urlencode()
+        return redirect(url, permanent=True)
+    return wrapper
+
+
+@follow_move
+@conditional.conditional_page('post_detail', conditional.post_version)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post, archived = get_post(post_id, 'author__profile', 'group')
     title = str(post)
-    count_post = Post.objects.filter(author=post.author).count()
+    count_post = profile_of(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    comments = comment_page(request, post.pk, archived)
     context = {
         'post': post,
         'count_post': count_post,
         'title_post': title,
         'form': form,
         'comments': comments,
+        'archived': archived,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def get_post(post_id, *related):
+    """Пост из горячей таблицы или архива и признак архива."""
+    post = shards.of_post(
+        shards.related(Post.objects, *related), post_id
+    ).filter(pk=post_id).first()
+    if post is not None:
+        return post, False
+    archived = ArchivedPost.objects.select_related(*related)
+    return get_object_or_404(archived, pk=post_id), True
+
+
+def comment_paginator(comments):
+    """Комментарии по порядку написания, COMMENTS_ON_PAGE на страницу."""
+    return KeysetPaginator(
+        comments, settings.COMMENTS_ON_PAGE, field='created', descending=False
+    )
+
+
+def comment_page(request, post_id, archived=False):
+    """Страница комментариев поста по курсору ?after= / ?before=."""
+    if archived:
+        comments = ArchivedComment.objects.filter(
+            post_id=post_id
+        ).select_related('author')
+    else:
+        comments = shards.of_post(
+            shards.related(
+                Comment.objects.filter(post_id=post_id), 'author'
+            ),
+            post_id,
+        )
+    return comment_paginator(comments).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+@follow_move
+def post_comments(request, post_id):
+    """Следующие комментарии поста: HTML-фрагмент или JSON
+    (?format=json)."""
+    post, archived = get_post(post_id)
+    comments = comment_page(request, post.pk, archived)
+    if request.GET.get('format') != 'json':
+        context = {
+            'post': post,
+            'comments': comments,
+        }
+        return render(request, 'posts/includes/comment_list.html', context)
+    next_url = None
+    if comments.has_next():
+        next_url = reverse('posts:post_comments', args=(post.pk,)) + (
+            '?' + urlencode({'after': comments.next_cursor, 'format': 'json'})
+        )
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            }
+            for comment in comments
+        ],
+        'next': next_url,
+    })
+
+
+def post_search(request):
+    if not search.available():
+        raise Http404
+    query = request.GET.get('q', '').strip()
+    page_obj = search.SearchPaginator(query, settings.POSTS_ON_PAGE).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(shards.of_post(Post.objects, post_id), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
+        return redirect(comment_url(post, comment))
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def comment_url(post, comment):
+    """Адрес страницы поста с комментарием и якорем на него."""
+    comments = shards.of_post(Comment.objects.filter(post=post), post.pk)
+    url = reverse('posts:post_detail', args=(post.pk,))
+    after = comment_paginator(comments).after_for(comment)
+    if after is not None:
+        url += '?' + urlencode({'after': after})
+    return f'{url}#comment-{comment.pk}'
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST' and form.is_valid():
         form.instance.author = request.user
-        form.save()
+        post = form.save()
+        if post.image:
+            thumbnails.process_upload(post)
         return redirect('posts:profile', request.user.username)
     context = {
         'form': form,
@@ -96,7 +232,7 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     is_edit = True
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(shards.of_post(Post.objects, post_id), pk=post_id)
     if post.author == request.user:
         form = PostForm(
             request.POST or None,
@@ -104,7 +240,15 @@ def post_edit(request, post_id):
             instance=post
         )
         if form.is_valid():
-            post = form.save()
+            post = form.save(commit=False)
+            old_variants = []
+            if 'image' in form.changed_data:
+                old_variants = post.variants
+                post.image_variants = ''
+            post.save()
+            thumbnails.discard_variants(post, old_variants)
+            if 'image' in form.changed_data and post.image:
+                thumbnails.process_upload(post)
             return redirect('posts:post_detail', post_id)
         form = PostForm(instance=post)
         return render(request, 'posts/create_post.html',
@@ -114,12 +258,12 @@ def post_edit(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = follow_posts(request.user).for_feed()
+    page_obj = paginate(request, posts, 'follow_index')
     context = {
         'page_obj': page_obj,
+        'cache_generation': generation(),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -145,3 +289,29 @@ def profile_unfollow(request, username):
         follow.delete()
         return redirect('posts:profile', username)
     return redirect('posts:profile', username)
+
+
+@staff_member_required
+def export_table(request, table):
+    """Потоковая выгрузка таблицы: ?format=ndjson|csv, ?since=, ?gzip=1."""
+    if table not in export.TABLES or export.sharded(table):
+        raise Http404
+    output_format = request.GET.get('format', 'ndjson')
+    if output_format not in export.FORMATS:
+        return HttpResponseBadRequest('Формат: ndjson или csv')
+    since = request.GET.get('since')
+    try:
+        since = export.parse_since(since) if since else None
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    compress = bool(request.GET.get('gzip'))
+    filename = f'{table}.{output_format}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        export.stream(table, output_format, since, compress),
+        content_type=(
+            'application/gzip' if compress
+            else export.FORMATS[output_format]
+        ),
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
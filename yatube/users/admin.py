@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import Profile
+
+
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'user', 'posts_count', 'followers_count', 'following_count'
+    )
+    search_fields = ('user__username',)
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Profile, ProfileAdmin)
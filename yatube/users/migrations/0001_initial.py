@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, help_text='Сколько постов опубликовал пользователь', verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, help_text='Сколько пользователей подписано на автора', verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, help_text='На скольких авторов подписан пользователь', verbose_name='Число подписок')),
+                ('user', models.OneToOneField(help_text='Пользователь, к которому относятся счётчики', on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def actual_count(model, lookup, outer):
+    counted = (
+        model.objects.filter(**{lookup: OuterRef(outer)})
+        .order_by()
+        .values(lookup)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile = apps.get_model('users', 'Profile')
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Profile.objects.bulk_create(
+        Profile(user_id=pk) for pk in User.objects.values_list('pk', flat=True)
+    )
+    Profile.objects.update(
+        posts_count=actual_count(Post, 'author', 'user'),
+        followers_count=actual_count(Follow, 'author', 'user'),
+        following_count=actual_count(Follow, 'user', 'user'),
+    )
+    Group.objects.update(posts_count=actual_count(Post, 'group', 'pk'))
+    Post.objects.update(comments_count=actual_count(Comment, 'post', 'pk'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('posts', '0018_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
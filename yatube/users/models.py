@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class Profile(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='Пользователь',
+        help_text='Пользователь, к которому относятся счётчики'
+    )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        help_text='Сколько постов опубликовал пользователь'
+    )
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        help_text='Сколько пользователей подписано на автора'
+    )
+    following_count = models.PositiveIntegerField(
+        'Число подписок',
+        default=0,
+        help_text='На скольких авторов подписан пользователь'
+    )
+
+    def __str__(self):
+        return f'Профиль {self.user}'
@@ -40,21 +40,26 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.sitemaps',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TimingMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,7 +69,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,12 +91,58 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite в режиме WAL с повтором записи при блокировке
+# (см. core.backends.sqlite3); соединения живут между запросами
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'timeout': 5,
+        },
     }
 }
+# Реплика для чтения; здесь - тот же файл, в бою - копия основной базы.
+# Чтения идут на реплики только из DATABASE_REPLICAS
+DATABASES['replica'] = {**DATABASES['default']}
+# Базы шардов постов и комментариев: по файлу на шард
+for number in range(2):
+    DATABASES[f'shard_{number}'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db-shard-{number}.sqlite3'),
+    }
+DATABASE_ROUTERS = [
+    'posts.shards.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+DATABASE_REPLICAS = []
+# Страницы, которые читают с реплик
+REPLICA_VIEWS = {
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+    'about:author',
+    'about:tech',
+}
+# На сколько секунд реплика может отстать; прочитанное с неё кэшируется
+# не дольше
+REPLICA_MAX_LAG = 5
+# Сколько секунд после записи клиент читает из основной базы; не меньше
+# REPLICA_MAX_LAG
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'primary_until'
+# Шарды постов, например ['shard_0', 'shard_1']; пусто - всё в основной
+# базе. Число слотов не меняется после включения: от него зависят id.
+# Поиск, архив, выгрузка постов и комментариев и материализованные
+# ленты работают только без шардов
+POST_SHARDS = []
+POST_SHARD_SLOTS = 64
+# Посты старше стольких дней команда archive_posts переносит в архив
+ARCHIVE_AFTER_DAYS = 365 * 2
+ARCHIVE_BATCH_SIZE = 500
 
 
 # Password validation
@@ -142,10 +193,74 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_ON_PAGE = 10
+# Комментарии под постом подгружаются страницами по курсору
+COMMENTS_ON_PAGE = 20
+# Наибольший ?limit= страницы JSON API
+API_MAX_PAGE_SIZE = 100
+# Постов в RSS и Atom
+FEED_ITEMS = 20
+# Записей на странице карты сайта (у поисковиков предел - 50000)
+SITEMAP_CHUNK_SIZE = 10000
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24
+# Постов в одной транзакции пакетного создания
+BULK_BATCH_SIZE = 500
+# Режим пагинации лент: 'classic' (?page=N) или 'keyset' (?after=/?before=)
+PAGINATION_DEFAULT = 'classic'
+PAGINATION_MODES = {
+    'index': 'classic',
+    'group_posts': 'classic',
+    'profile': 'classic',
+    'follow_index': 'classic',
+}
+# Материализованные ленты подписок: пост копируется в ленты подписчиков
+# при публикации, кроме авторов с числом подписчиков выше лимита
+TIMELINE_ENABLED = False
+TIMELINE_LENGTH = 800
+TIMELINE_FANOUT_LIMIT = 5000
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Общий для всех процессов кэш - memcached по адресу из окружения.
+# Без него кэш живёт в памяти процесса, и сброс поколения лент виден
+# только процессу, который записал; проверки core.checks не дают
+# долгих TTL с таким кэшем
+MEMCACHED_LOCATION = os.getenv('MEMCACHED_LOCATION')
+if MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': MEMCACHED_LOCATION,
+        }
     }
-}
+    # Фрагменты лент сбрасываются сигналами, поэтому TTL может быть долгим
+    FEED_CACHE_TIMEOUT = 60 * 60
+    # Сессии в кэше с записью в базу; без хранилища вовсе -
+    # 'django.contrib.sessions.backends.signed_cookies'
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    # Сколько хранится в кэше пользователь сессии (см. core.auth)
+    AUTH_USER_CACHE_TIMEOUT = 60 * 15
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    FEED_CACHE_TIMEOUT = 20
+    # Выход и смена пароля сбрасывали бы кэш только одного процесса
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+    AUTH_USER_CACHE_TIMEOUT = 0
+
+# Миниатюры картинок постов готовятся в фоновом пуле потоков
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+POST_THUMBNAIL_ASYNC = True
+POST_THUMBNAIL_WORKERS = 2
+# Ширины и форматы адаптивных копий картинок (WebP - если есть в Pillow)
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('webp', 'jpeg')
+POST_IMAGE_QUALITY = 80
+
+# Замеры запросов: заголовок Server-Timing и перцентили по представлениям
+TIMING_ENABLED = True
+# Заголовок Server-Timing всем клиентам; персоналу он виден всегда
+TIMING_HEADER = DEBUG
+TIMING_BUFFER_SIZE = 1000